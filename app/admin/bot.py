@@ -1,21 +1,27 @@
 import asyncio
 import os
 import json
-from aiogram import Bot, Dispatcher, types
+from typing import Optional
+from aiogram import Bot, Dispatcher, F, types
 from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from dotenv import load_dotenv
-from redis import Redis
-import requests
 from dto import dto as DTO
-from routers.order import send_message
+from fastapi import HTTPException
+from redis.exceptions import ResponseError
+from config import ORDERS_STREAM_MAX_ATTEMPTS
+from routers.order import order_service, send_message
+from services.order_board import OrderBoard
+from services.order_stream import OrderStream
+from services.shared import telegram
 
 load_dotenv()
 
 # Получение токена из .env
 API_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_CHAT_IDS = os.getenv("ADMIN_CHAT_ID", "").split()  # Администраторские чаты
-REDIS_HOST = os.getenv("REDIS_HOST", "0.0.0.0")
 
 # Проверка токена
 if not API_TOKEN:
@@ -25,11 +31,8 @@ if not API_TOKEN:
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 
-# Настройка Redis
-redis_client = Redis(host=REDIS_HOST, port=6379, decode_responses=True)
-
-# Переменная для отслеживания последнего обработанного заказа
-last_processed_order_id = 0
+# Новые заказы приходят из потока Redis через группу потребителей
+order_stream = OrderStream()
 
 
 # Форматирование заказа
@@ -78,14 +81,9 @@ class Order:
     def _format_telegram_message(self, order_dto: DTO.Order) -> str:
         return f"Ваш заказ №{order_dto.number}, начали готовить!"
 
-    def _send_telegram_message(self, chat_id: int, message: str):
+    async def _send_telegram_message(self, chat_id: int, message: str):
         try:
-            response = requests.get(
-                f"https://api.telegram.org/bot{self.CLIENT_BOT_TOKEN}/sendMessage",
-                params={"chat_id": chat_id, "text": message}
-            )
-            if response.status_code != 200:
-                print(f"Ошибка отправки в Telegram: {response.text}")
+            await telegram.send(self.CLIENT_BOT_TOKEN, chat_id, message)
         except Exception as e:
             print(f"Ошибка отправки в Telegram: {e}")
 
@@ -93,88 +91,153 @@ class Order:
 order_handler = Order()
 
 
-# Генерация клавиатуры
-def get_order_keyboard():
+# Генерация клавиатуры: в callback_data передаются chat ID клиента и id заказа,
+# поэтому кнопки разных заказов не зависят друг от друга
+def get_order_keyboard(order):
+    suffix = f"{order.get('client')}:{order.get('id', '')}"
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="Принять", callback_data="accept"),
-            InlineKeyboardButton(text="Отклонить", callback_data="decline")
+            InlineKeyboardButton(text="Принять", callback_data=f"accept:{suffix}"),
+            InlineKeyboardButton(text="Отклонить", callback_data=f"decline:{suffix}")
         ]
     ])
     return kb
 
 
+async def change_order_state(order_id: str, state: str, reason: Optional[str] = None) -> Optional[str]:
+    # Состояние меняется на доске, в БД и рассылается клиентам WebSocket;
+    # у кнопок старых заказов id нет. Возвращает текст ошибки для сотрудника
+    if not order_id:
+        return None
+    try:
+        await order_service.change_state(int(order_id), state, reason)
+    except HTTPException as e:
+        return str(e.detail)
+    except Exception as e:
+        print(f"Ошибка смены состояния заказа {order_id}: {e}")
+    return None
+
+
+class DeclineOrder(StatesGroup):
+    reason = State()
+
+
 # Обработчик callback-событий
-@dp.callback_query()
-async def handle_callback(callback: CallbackQuery):
+@dp.callback_query(F.data.startswith("accept:") | F.data.startswith("decline:"))
+async def handle_callback(callback: CallbackQuery, state: FSMContext):
     # Получение данных из callback_data
-    if callback.data == "accept":
+    action, client_chat_id, order_id = (callback.data.split(":") + [""])[:3]
+    if action == "accept":
         # Отправка сообщения 
         msg = "Ваш заказ принят! Мы начали его готовить!"
-        req = requests.get(
-                f"https://api.telegram.org/bot{order_handler.CLIENT_BOT_TOKEN}/sendMessage",
-                params={
-                    "chat_id": orderr["client"], 
-                    "text": msg
-                }
-            )
-        print(orderr["client"])
+        error = await change_order_state(order_id, OrderBoard.ACCEPTED)
+        if error:
+            await callback.message.answer(f"Заказ не принят: {error}")
+            await callback.answer()
+            return
+        await order_handler._send_telegram_message(client_chat_id, msg)
         
         # Сообщение сотруднику
         await callback.message.answer("Вы приняли заказ! Клиенту отправлено уведомление.")
     
-    elif callback.data == "decline":
+    elif action == "decline":
         # Запрос причины отказа
+        await state.set_state(DeclineOrder.reason)
+        await state.update_data(client=client_chat_id, order_id=order_id)
         await callback.message.answer(
             "Пожалуйста, укажите причину отклонения заказа, отправив её следующим сообщением.",
         )
-        
-        # Ожидание причины от администратора
-        @dp.message()
-        async def handle_decline_reason(message: types.Message):
-            reason = message.text
-            client_chat_id = orderr["client"]
-            client_message = (
-                f"Ваш заказ был отклонен. Мы извиняемся за неудобства.\n"
-                f"Причина: {reason}"
-            )
-            order_handler._send_telegram_message(client_chat_id, client_message)
-            
-            # Сообщение сотруднику
-            await message.answer("Клиенту отправлено уведомление об отказе.")
     
     # Закрытие callback-запроса
     await callback.answer()
 
 
-# Функция проверки новых заказов
+# Ожидание причины отказа от администратора
+@dp.message(DeclineOrder.reason)
+async def handle_decline_reason(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    client_message = (
+        f"Ваш заказ был отклонен. Мы извиняемся за неудобства.\n"
+        f"Причина: {message.text}"
+    )
+    error = await change_order_state(data.get("order_id"), OrderBoard.DECLINED, message.text)
+    if error:
+        await message.answer(f"Заказ не отклонен: {error}")
+        return
+    await order_handler._send_telegram_message(data["client"], client_message)
+    
+    # Сообщение сотруднику
+    await message.answer("Клиенту отправлено уведомление об отказе.")
+
+
+async def notify_admins(order, chat_ids) -> list:
+    # Администраторам отправляется параллельно через общую очередь с лимитами Telegram;
+    # возвращаются чаты, которым заказ доставлен
+    formatted_order = format_order(order)
+    keyboard = get_order_keyboard(order).model_dump(exclude_none=True)
+    results = await asyncio.gather(*(
+        telegram.send(API_TOKEN, chat_id, formatted_order, reply_markup=keyboard)
+        for chat_id in chat_ids
+    ), return_exceptions=True)
+    delivered = []
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            print(f"Ошибка отправки сообщения в чат {chat_id}: {result}")
+        else:
+            delivered.append(chat_id)
+    return delivered
+
+
+async def deliver_order(entry_id, order):
+    # Заказ подтверждается, только когда его получили все администраторы.
+    # Иначе он остается неподтвержденным, и после ORDERS_STREAM_CLAIM_IDLE
+    # повторно отправляется только тем, кто его еще не получил
+    delivered, attempt = await order_stream.start_delivery(entry_id)
+    pending = [chat_id for chat_id in ADMIN_CHAT_IDS if chat_id not in delivered]
+    sent = await notify_admins(order, pending)
+    await order_stream.mark_delivered(entry_id, sent)
+    failed = [chat_id for chat_id in pending if chat_id not in sent]
+    if not failed:
+        await order_stream.ack(entry_id)
+    elif attempt >= ORDERS_STREAM_MAX_ATTEMPTS:
+        print(f"Заказ {entry_id} не доставлен в чаты {', '.join(failed)} после {attempt} попыток")
+        await order_stream.ack(entry_id)
+
+
+# Функция получения новых заказов
 async def check_for_new_orders():
-    global last_processed_order_id
+    # Заказ подтверждается в потоке только после отправки администраторам;
+    # неподтвержденные заказы (в том числе других экземпляров бота) забираются повторно
+    if not ADMIN_CHAT_IDS:
+        # Без получателей заказы не забираются: иначе они копились бы в списке
+        # неподтвержденных. Поток ограничен по длине и дождется настройки ADMIN_CHAT_ID
+        print("Предупреждение: ADMIN_CHAT_ID не задан, новые заказы не рассылаются")
+        return
+    group_ready = False
     while True:
         try:
-            last_order_id = redis_client.get("order_id")
-            if last_order_id and int(last_order_id) > last_processed_order_id:
-                last_processed_order_id = int(last_order_id)
-                last_order_data = redis_client.get(f"order:{last_order_id}")
-                if last_order_data:
-                    global orderr
-                    orderr = json.loads(last_order_data)
-                    formatted_order = format_order(orderr)
-
-                    # Отправляем уведомления администраторам
-                    for chat_id in ADMIN_CHAT_IDS:
-                        try:
-                            await bot.send_message(chat_id, formatted_order, reply_markup=get_order_keyboard())
-                        except Exception as e:
-                            print(f"Ошибка отправки сообщения в чат {chat_id}: {e}")
-
+            if not group_ready:
+                await order_stream.ensure_group()
+                group_ready = True
+            entries = await order_stream.reclaim()
+            entries += await order_stream.read()
+            for entry_id, order in entries:
+                await deliver_order(entry_id, order)
+        except ResponseError as e:
+            if "NOGROUP" in str(e):
+                # Группа потребителей пропала (FLUSHALL, переключение Redis) - создаем заново
+                print("Группа потребителей заказов не найдена, создаем заново")
+                group_ready = False
+                continue
+            print(f"Ошибка при проверке заказов: {e}")
+            await asyncio.sleep(1)
         except Exception as e:
             print(f"Ошибка при проверке заказов: {e}")
-
-        await asyncio.sleep(0.1)
+            await asyncio.sleep(1)
 
 
 # Команда /start
 @dp.message(Command("start"))
 async def start_command(message: types.Message):
-    await message.answer(f"Бот запущен и проверяет новые заказы каждую секунду. Ваш ID: {message.chat.id}")
+    await message.answer(f"Бот запущен и получает новые заказы. Ваш ID: {message.chat.id}")
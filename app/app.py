@@ -4,11 +4,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from routers.routers import *
 from scalar_fastapi import get_scalar_api_reference
 from fastapi.staticfiles import StaticFiles
-from services.redis_service import RedisService
-from services.sbis import SBISService, SBISBusinessLogic
-from config import APP_CLIENT_ID, APP_SECRET, APP_SECRET_KEY
-from dto.dto import AuthorizationData
-import asyncio
+from services.shared import auth_data, redis_service, sbis_service, sbis_logic, sync_scheduler, order_outbox, telegram, ws_hub
+from services.redis_pool import close_redis
 
 app = FastAPI(tags=["Freestyle BOT"])
 
@@ -32,6 +29,8 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PATCH", "PUT"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", "Access-Control-Allow-Origin",
                    "Authorization"],
+    # Курсор следующей страницы заказов и признак устаревшего меню передаются заголовками
+    expose_headers=["X-Next-Cursor", "X-Catalog-Stale"],
 )
 
 app.include_router(router)
@@ -47,29 +46,23 @@ UPLOAD_DIR = os.path.abspath("uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)   
 app.mount("/static", StaticFiles(directory=UPLOAD_DIR), name="static")
 
-# Initialize services and logic
-redis_service = RedisService()
-sbis_service = SBISService()
-auth_data = AuthorizationData(
-    app_client_id=APP_CLIENT_ID,
-    app_secret=APP_SECRET,
-    secret_key=APP_SECRET_KEY
-)
-sbis_logic = SBISBusinessLogic(sbis_service, redis_service)
-
 @app.on_event("startup")
 async def startup_event():
     await sbis_service.__aenter__()
-    asyncio.create_task(update_products_periodic())
+    await redis_service.migrate_carts()
+    sbis_service.tokens.start(auth_data)
+    sbis_logic.start()
+    sync_scheduler.start()
+    order_outbox.start()
+    ws_hub.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await ws_hub.stop()
+    await order_outbox.stop()
+    await sync_scheduler.stop()
+    await sbis_service.tokens.stop()
+    await sbis_logic.close()
     await sbis_service.close()
-
-async def update_products_periodic():
-    while True:
-        try:
-            await sbis_logic.update_products_cache(auth_data)
-        except Exception as e:
-            print(f"Error updating products: {e}")
-        await asyncio.sleep(30)
+    await telegram.close()
+    await close_redis()
@@ -10,9 +10,118 @@ DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 REDIS_HOST = os.environ.get("REDIS_HOST")
-REDIS_PORT = 6380 #os.environ.get("REDIS_PORT")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6380))
 ADMIN_CHAT_ID = os.environ.get("ADMIN_CHAT_ID")
 CLIENT_BOT_TOKEN = os.environ.get("CLIENT_BOT_TOKEN")
 APP_CLIENT_ID = os.getenv("APP_CLIENT_ID")
 APP_SECRET = os.getenv("APP_SECRET")
 APP_SECRET_KEY = os.getenv("APP_SECRET_KEY")
+
+# Пул соединений и таймауты HTTP-клиента СБИС
+SBIS_POOL_SIZE = int(os.environ.get("SBIS_POOL_SIZE", 20))
+SBIS_POOL_PER_HOST = int(os.environ.get("SBIS_POOL_PER_HOST", 8))
+SBIS_KEEPALIVE_TIMEOUT = float(os.environ.get("SBIS_KEEPALIVE_TIMEOUT", 30))
+SBIS_CONNECT_TIMEOUT = float(os.environ.get("SBIS_CONNECT_TIMEOUT", 5))
+SBIS_REQUEST_TIMEOUT = float(os.environ.get("SBIS_REQUEST_TIMEOUT", 15))
+SBIS_NOMENCLATURE_TIMEOUT = float(os.environ.get("SBIS_NOMENCLATURE_TIMEOUT", 60))
+SBIS_RETRIES = int(os.environ.get("SBIS_RETRIES", 3))
+SBIS_PAGE_SIZE = int(os.environ.get("SBIS_PAGE_SIZE", 500))
+SBIS_BREAKER_FAILURES = int(os.environ.get("SBIS_BREAKER_FAILURES", 5))
+SBIS_BREAKER_COOLDOWN = float(os.environ.get("SBIS_BREAKER_COOLDOWN", 30))
+SBIS_TOKEN_TTL = int(os.environ.get("SBIS_TOKEN_TTL", 3600))
+SBIS_TOKEN_REFRESH_MARGIN = int(os.environ.get("SBIS_TOKEN_REFRESH_MARGIN", 300))
+
+# Метаданные СБИС: точка продаж и прайс-листы (по названию или id)
+SBIS_METADATA_TTL = int(os.environ.get("SBIS_METADATA_TTL", 3600))
+SBIS_SALES_POINT = os.environ.get("SBIS_SALES_POINT")
+SBIS_MENU_PRICE_LIST = os.environ.get("SBIS_MENU_PRICE_LIST")
+SBIS_CATEGORY_PRICE_LIST = os.environ.get("SBIS_CATEGORY_PRICE_LIST")
+
+# Публичный адрес API: фронтенд работает на другом домене, поэтому ссылки
+# на раздаваемые API файлы должны быть абсолютными
+API_BASE_URL = os.environ.get("API_BASE_URL", "https://api.kimchistop.ru").rstrip("/")
+
+# Локальное зеркало фотографий товаров (раздается через /static)
+IMAGE_MIRROR_ENABLED = os.environ.get("IMAGE_MIRROR_ENABLED", "true").lower() == "true"
+IMAGE_MIRROR_DIR = os.environ.get("IMAGE_MIRROR_DIR", os.path.join("uploads", "products"))
+IMAGE_MIRROR_URL = os.environ.get("IMAGE_MIRROR_URL", f"{API_BASE_URL}/static/products")
+IMAGE_MIRROR_TIMEOUT = float(os.environ.get("IMAGE_MIRROR_TIMEOUT", 20))
+IMAGE_MIRROR_WORKERS = int(os.environ.get("IMAGE_MIRROR_WORKERS", 2))
+IMAGE_MIRROR_CONCURRENCY = int(os.environ.get("IMAGE_MIRROR_CONCURRENCY", 8))
+
+# Планировщик синхронизации меню (выполняется только на воркере-лидере)
+CATALOG_SYNC_INTERVAL = float(os.environ.get("CATALOG_SYNC_INTERVAL", 30))
+CATALOG_SYNC_MIN_INTERVAL = float(os.environ.get("CATALOG_SYNC_MIN_INTERVAL", 15))
+CATALOG_SYNC_MAX_INTERVAL = float(os.environ.get("CATALOG_SYNC_MAX_INTERVAL", 300))
+CATALOG_SYNC_LEASE = float(os.environ.get("CATALOG_SYNC_LEASE", 60))
+# Сколько секунд воркер без меню ждет синхронизации от лидера, прежде чем вернуть 503
+CATALOG_COLD_WAIT = float(os.environ.get("CATALOG_COLD_WAIT", 30))
+# Сколько секунд воркер отдает меню из памяти, не сверяя версию с Redis
+CATALOG_CACHE_MAX_STALENESS = float(os.environ.get("CATALOG_CACHE_MAX_STALENESS", 5))
+
+# Дерево категорий: корневые разделы меню и исключенные поддеревья (id через запятую)
+CATALOG_ROOT_CATEGORIES = [int(i) for i in os.environ.get("CATALOG_ROOT_CATEGORIES", "2110").split(",") if i.strip()]
+CATALOG_EXCLUDED_CATEGORIES = [int(i) for i in os.environ.get("CATALOG_EXCLUDED_CATEGORIES", "2382").split(",") if i.strip()]
+
+# Общий асинхронный пул соединений Redis
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 5))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+# Как долго подписка ждет сообщение за одно чтение; должно быть меньше REDIS_SOCKET_TIMEOUT
+REDIS_PUBSUB_POLL_INTERVAL = float(os.environ.get("REDIS_PUBSUB_POLL_INTERVAL", 1))
+# Формат значений в Redis: json, orjson или msgpack
+REDIS_CODEC = os.environ.get("REDIS_CODEC", "orjson")
+
+# Срок жизни корзины без обращений, секунды
+CART_TTL = int(os.environ.get("CART_TTL", 7 * 24 * 3600))
+
+# Срок жизни кэша меню по категориям (/category/dis); сбрасывается при изменениях
+GROUPED_MENU_TTL = int(os.environ.get("GROUPED_MENU_TTL", 3600))
+
+# Outbox побочных действий заказа
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_RETRY_DELAY = float(os.environ.get("OUTBOX_RETRY_DELAY", 2))
+OUTBOX_RETRY_MAX_DELAY = float(os.environ.get("OUTBOX_RETRY_MAX_DELAY", 300))
+# На сколько секунд воркер забирает записи; по истечении их подхватит другой воркер
+OUTBOX_LEASE = float(os.environ.get("OUTBOX_LEASE", 120))
+
+# Поток новых заказов для бота администраторов
+ORDERS_STREAM_MAXLEN = int(os.environ.get("ORDERS_STREAM_MAXLEN", 10000))
+ORDERS_STREAM_GROUP = os.environ.get("ORDERS_STREAM_GROUP", "admin_bot")
+ORDERS_STREAM_BLOCK = float(os.environ.get("ORDERS_STREAM_BLOCK", 2))  # меньше REDIS_SOCKET_TIMEOUT
+ORDERS_STREAM_CLAIM_IDLE = float(os.environ.get("ORDERS_STREAM_CLAIM_IDLE", 60))
+# Сколько раз заказ пытаются доставить недоступным чатам, прежде чем подтвердить без них
+ORDERS_STREAM_MAX_ATTEMPTS = int(os.environ.get("ORDERS_STREAM_MAX_ATTEMPTS", 5))
+
+# Отправка сообщений в Telegram: лимиты Bot API на бота и на чат
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = float(os.environ.get("TELEGRAM_CHAT_BURST", 1))
+TELEGRAM_CONCURRENCY = int(os.environ.get("TELEGRAM_CONCURRENCY", 8))
+TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", 5))
+TELEGRAM_TIMEOUT = float(os.environ.get("TELEGRAM_TIMEOUT", 10))
+
+# Список и выгрузка заказов
+ORDERS_PAGE_SIZE = int(os.environ.get("ORDERS_PAGE_SIZE", 50))
+ORDERS_PAGE_MAX = int(os.environ.get("ORDERS_PAGE_MAX", 500))
+ORDERS_EXPORT_BATCH = int(os.environ.get("ORDERS_EXPORT_BATCH", 500))
+
+# WebSocket-уведомления о заказах
+WS_QUEUE_SIZE = int(os.environ.get("WS_QUEUE_SIZE", 100))
+WS_SLOW_POLICY = os.environ.get("WS_SLOW_POLICY", "drop")  # drop или disconnect
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", 5))
+WS_ADMIN_TOKEN = os.environ.get("WS_ADMIN_TOKEN")  # без токена тема admins недоступна
+# Ключ подписи тем order:<id> и user:<id>; без него на эти темы подписаться нельзя
+WS_TOKEN_SECRET = os.environ.get("WS_TOKEN_SECRET")
+# Срок действия initData Telegram Mini App при выдаче токена пользователя, секунды
+WS_INIT_DATA_MAX_AGE = int(os.environ.get("WS_INIT_DATA_MAX_AGE", 86400))
+
+# Сводки продаж: часы и дни считаются в местном времени заведения
+SALES_TIMEZONE = os.environ.get("SALES_TIMEZONE", "Europe/Moscow")
+
+# Доска активных заказов: заказы старше этого срока снимаются с доски
+ORDER_BOARD_MAX_AGE = int(os.environ.get("ORDER_BOARD_MAX_AGE", 24 * 3600))
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional, Union, List, Dict
 from pydantic import BaseModel
 
@@ -27,6 +28,19 @@ class Order(BaseModel):
     cutlery: Optional[int] = None
 
 
+class OrderFilter(BaseModel):
+    state: Optional[str] = None
+    isDelivery: Optional[bool] = None
+    client: Optional[int] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+
+class OrderStateChange(BaseModel):
+    state: str
+    reason: Optional[str] = None
+
+
 class Category(BaseModel):
     categoryName: Optional[str] = None
     food: Optional[List] = []
@@ -68,10 +82,18 @@ class FoodsRequest(BaseModel):
     withBarcode: Optional[bool] = True
     onlyPublished: Optional[bool] = True
     pageSize: Optional[str] = '2000'
+    page: Optional[int] = 0
     noStopList: Optional[bool] = True
 
 
 class CartRedis(BaseModel):
     user_id: int
     product_id: int
-    quantity: int
\ No newline at end of file
+    quantity: int
+
+class MenuSyncResult(BaseModel):
+    version: Optional[int] = None
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
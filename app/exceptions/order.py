@@ -0,0 +1,11 @@
+from fastapi import HTTPException, status
+
+class OrderStateError(HTTPException):
+    """Order state transition is not allowed."""
+    def __init__(self, order_id: int, current: str, target: str):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order {order_id} cannot move from {current} to {target}"
+        )
+        self.current = current
+        self.target = target
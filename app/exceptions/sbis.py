@@ -14,3 +14,9 @@ class SBISRequestError(SBISException):
     """Request error."""
     def __init__(self, detail: str):
         super().__init__(f"SBIS request failed: {detail}")
+
+class SBISUnavailableError(SBISException):
+    """SBIS is temporarily unavailable (circuit breaker is open)."""
+    def __init__(self):
+        super().__init__("SBIS is temporarily unavailable")
+        self.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
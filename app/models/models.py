@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Boolean, ARRAY, JSON, text
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Boolean, ARRAY, JSON, Date, DateTime, Numeric, Index, text, func
 from sqlalchemy.orm import declarative_base, Mapped, DeclarativeMeta
 metadata = MetaData()
 Base: DeclarativeMeta = declarative_base()
@@ -20,6 +20,13 @@ class User(Base):
 
 class Order(Base):
     __tablename__ = "order"
+    # Индексы под фильтры списка заказов; постраничная выдача идет по id
+    __table_args__ = (
+        Index("ix_order_state_id", "state", "id"),
+        Index("ix_order_client_id", "client", "id"),
+        Index("ix_order_is_delivery_id", "isDelivery", "id"),
+        Index("ix_order_created_at", "createdAt"),
+    )
     id: Mapped[int] = Column(Integer, unique=True, primary_key=True)
     number: Mapped[int] = Column(Integer, nullable=True)
     items: Mapped[list] = Column(ARRAY(JSON), nullable=True)
@@ -32,11 +39,62 @@ class Order(Base):
     comment: Mapped[str] = Column(String, nullable=True)
     client: Mapped[str] = Column(ForeignKey("user.id"), nullable=True)
     cutlery: Mapped[str] = Column(Integer, nullable=True, default=1)
+    # Время создания задает create_order; у заказов, созданных до появления
+    # колонки, оно неизвестно и остается NULL
+    createdAt = Column(DateTime(timezone=True), nullable=True)
 
 
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__tablename__.columns}
 
+class OrderOutbox(Base):
+    """
+    Побочные действия заказа (уведомления, публикация в Redis), записанные
+    в одной транзакции с самим заказом и выполняемые диспетчером outbox.
+    """
+    __tablename__ = "order_outbox"
+    __table_args__ = (
+        Index("ix_order_outbox_due", "status", "next_attempt_at"),
+    )
+    id: Mapped[int] = Column(Integer, unique=True, primary_key=True)
+    order_id: Mapped[int] = Column(ForeignKey("order.id"), nullable=False)
+    event: Mapped[str] = Column(String, nullable=False)
+    dedup_key: Mapped[str] = Column(String, nullable=False, unique=True)
+    payload: Mapped[dict] = Column(JSON, nullable=False)
+    status: Mapped[str] = Column(String, nullable=False, default="pending")
+    attempts: Mapped[int] = Column(Integer, nullable=False, default=0)
+    last_error: Mapped[str] = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class SalesHourly(Base):
+    """Выручка, число заказов и блюд за час (местное время SALES_TIMEZONE)."""
+    __tablename__ = "sales_hourly"
+    bucket = Column(DateTime, primary_key=True)
+    orders: Mapped[int] = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    items: Mapped[int] = Column(Integer, nullable=False, default=0)
+
+
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+    day = Column(Date, primary_key=True)
+    orders: Mapped[int] = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    items: Mapped[int] = Column(Integer, nullable=False, default=0)
+
+
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+    day = Column(Date, primary_key=True)
+    product_key: Mapped[str] = Column(String, primary_key=True)
+    product_name: Mapped[str] = Column(String, nullable=True)
+    quantity: Mapped[int] = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+
 class Category(Base):
     __tablename__ = "category"
     id = Column(Integer, unique=True, primary_key=True)
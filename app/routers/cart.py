@@ -1,9 +1,8 @@
 import logging
 from fastapi import APIRouter, HTTPException
-from services.redis_service import RedisService
+from services.shared import redis_service as redis, sbis_logic
 from dto.dto import CartRedis
 
-redis = RedisService()
 cart_router = APIRouter()
 
 logger = logging.getLogger(__name__)
@@ -26,6 +25,48 @@ async def get_cart(user_id: int):
         logger.error(f"Ошибка обработки данных: {e}")
         raise HTTPException(status_code=500, detail={"error": f"{e}"})
     
+@cart_router.get("/{user_id}/view", summary="Корзина с ценами и итогом")
+async def get_priced_cart(user_id: int):
+    """
+    Позиции корзины вместе с названием, ценой и суммой по строке.
+
+    Все товары ищутся за один проход по индексу меню, поэтому клиенту не
+    нужно запрашивать каждый товар отдельно. Товары, которых больше нет
+    в меню, возвращаются с available = false и в итог не входят.
+    """
+    try:
+        cart = await redis.get_cart(user_id)
+        product_ids = [item["product_id"] for item in cart["items"]]
+        products = await sbis_logic.get_products_by_ids(product_ids)
+
+        items = []
+        total = 0
+        for item in cart["items"]:
+            product = products.get(item["product_id"])
+            available = bool(
+                product and product.get("status") == "available" and product.get("price") is not None
+            )
+            line_total = round(product["price"] * item["quantity"], 2) if available else 0
+            total += line_total
+            items.append({
+                "product_id": item["product_id"],
+                "quantity": item["quantity"],
+                "name": product.get("name") if product else None,
+                "image": product.get("image") if product else None,
+                "price": product.get("price") if product else None,
+                "line_total": line_total,
+                "available": available,
+            })
+        return {
+            "items": items,
+            "total": round(total, 2),
+            "count": sum(item["quantity"] for item in items if item["available"]),
+            "has_unavailable": any(not item["available"] for item in items),
+        }
+    except Exception as e:
+        logger.error(f"Ошибка обработки данных: {e}")
+        raise HTTPException(status_code=500, detail={"error": f"{e}"})
+
 @cart_router.patch("/update", summary="Обновление товара в корзине")
 async def update_item_from_cart(cart: CartRedis):
     try:
@@ -1,11 +1,13 @@
 import json
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from sqlalchemy import delete, insert, select, update
+from fastapi import APIRouter, Depends, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy import any_, delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from auth.database import get_async_session
+from config import GROUPED_MENU_TTL
 from dto import dto as DTO
 from models.models import *
-from typing import Any, Optional
+from services.shared import redis_service
+from typing import Any, List, Optional
 
 
 categoryRouter = APIRouter()
@@ -16,6 +18,7 @@ async def category_add(catDTO: DTO.Category, session: AsyncSession = Depends(get
     query = insert(Category).values(catDTO.model_dump())
     await session.execute(query)
     await session.commit()
+    await redis_service.invalidate_grouped_menu()
 
 @categoryRouter.get('/')
 async def category_name_get(session: AsyncSession = Depends(get_async_session)):
@@ -34,6 +37,7 @@ async def update_categories(id: int, catDTO: DTO.Category, session: AsyncSession
     query = update(Category).where(Category.id == id).values(food=catDTO.food)
     await session.execute(query)
     await session.commit()
+    await redis_service.invalidate_grouped_menu()
     return "success"
 
 @categoryRouter.patch('/{id}')
@@ -41,35 +45,36 @@ async def update_category_name(id: int, name: str, session: AsyncSession = Depen
     query = update(Category).where(Category.id == id).values(categoryName = name)
     await session.execute(query)
     await session.commit()
+    await redis_service.invalidate_grouped_menu()
     return "success"
 
-@categoryRouter.get('/dis')
-async def distributing_foods(session: AsyncSession = Depends(get_async_session)):
-    query_food_id = select(Food.id)
-    query_food = select(Food)
-    query_cat_name = select(Category.categoryName)
-    query_cat_foods = select(Category.food)
-
-
-    result_food_id = await session.execute(query_food_id)
-    result_food = await session.execute(query_food)
-    result_cat_name = await session.execute(query_cat_name)
-    result_cat_food = await session.execute(query_cat_foods)
-
-
-    cat_name = result_cat_name.mappings().all()
-    cat_foods = result_cat_food.mappings().all()
-    food_id = result_food_id.mappings().all()
-    foods = result_food.mappings().all()
-
+async def build_grouped_menu(session: AsyncSession) -> List[dict]:
+    """
+    Меню по категориям одним запросом: блюда присоединяются к категории
+    по вхождению id в Category.food (индекс по первичному ключу food)
+    """
+    food_columns = [column.name for column in Food.__table__.columns]
+    query = (
+        select(Category.id, Category.categoryName, *Food.__table__.columns)
+        .outerjoin(Food, Food.id == any_(Category.food))
+        .order_by(Category.id, Food.id)
+    )
     result = []
+    current_id = None
+    for row in (await session.execute(query)).all():
+        if row[0] != current_id:
+            current_id = row[0]
+            result.append({"categoryName": row[1], "foods": []})
+        if row[2] is not None:
+            result[-1]["foods"].append(dict(zip(food_columns, row[2:])))
+    return result
 
-    for el in range(len(cat_name)):
-        result.append({
-            "categoryName": cat_name[el]["categoryName"],
-            "foods": []
-        })
-        for e in range(len(food_id)):
-            if food_id[e]["id"] in cat_foods[el]["food"]:
-                result[el]["foods"].append(foods[e]["Food"])
-    return result
\ No newline at end of file
+@categoryRouter.get('/dis')
+async def distributing_foods(session: AsyncSession = Depends(get_async_session)):
+    body = await redis_service.get_grouped_menu()
+    if body is None:
+        version = await redis_service.get_grouped_menu_version()
+        body = json.dumps(await build_grouped_menu(session), ensure_ascii=False)
+        if version is not None:
+            await redis_service.set_grouped_menu(body, version, GROUPED_MENU_TTL)
+    return Response(content=body, media_type="application/json")
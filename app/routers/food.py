@@ -3,9 +3,8 @@ from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from config import APP_CLIENT_ID, APP_SECRET, APP_SECRET_KEY
-from services.sbis import SBISService
-from services.sbis import AuthorizationData
+from config import CATALOG_EXCLUDED_CATEGORIES
+from services.shared import auth_data, redis_service, sbis_service as sbis, sbis_logic
 from auth.database import get_async_session
 from dto import dto as DTO
 from models.models import Food
@@ -19,6 +18,7 @@ class FoodService:
             query = insert(Food).values(**food_dto.model_dump())
             await session.execute(query)
             await session.commit()
+            await redis_service.invalidate_grouped_menu()
             return {"message": "Food added successfully"}
         except Exception as e:
             await session.rollback()
@@ -29,25 +29,21 @@ class FoodService:
         Получение списка блюд из API СБИСа
         """
         try:
-            foods = await SBISService.get_foods(request, token)
-            if not foods.get('nomenclatures'):
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No foods found")
-            
             # Добавляем базовый URL к каждому изображению и фильтруем товары
             base_url = "https://api.sbis.ru/retail"
             filtered_foods = []
             
-            for food in foods['nomenclatures']:
-                # Проверяем, не является ли hierarchicalParent равным 2382
-                if food.get('hierarchicalParent') == 2382:
+            async for food in sbis.iter_foods(request, token):
+                # Пропускаем товары из исключенных категорий
+                if food.get('hierarchicalParent') in CATALOG_EXCLUDED_CATEGORIES:
                     continue  # Пропускаем этот товар
                 
                 if 'images' in food and food['images'] is not None:
                     # Фильтруем изображения, оставляя только те, которые не равны null
                     valid_images = [base_url + image for image in food['images'] if image is not None]
                     if valid_images:  # Проверяем, есть ли хотя бы одно валидное изображение
-                        food['image'] = valid_images[0]  # Используем только первое валидное изображение
-                        filtered_foods.append(food)  # Добавляем в отфильтрованный список
+                        # Ответ СБИС общий для одновременных запросов, поэтому копируем запись
+                        filtered_foods.append({**food, 'image': valid_images[0]})  # Используем только первое валидное изображение
             
             if not filtered_foods:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No valid foods found")
@@ -61,10 +57,16 @@ class FoodService:
         Получение списка категорий из API СБИСа с cost = null
         """
         try:
-            foods = await SBISService.get_foods(request, token)
-            if not foods.get('nomenclatures'):
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No foods found")
-            
+            # Категории берутся из дерева, построенного при синхронизации меню;
+            # номенклатура СБИС просматривается, только пока дерева еще нет
+            tree = await sbis_logic.get_category_list()
+            if tree:
+                return [
+                    {"name": category["name"], "hierarchicalId": category["hierarchicalId"]}
+                    for category in tree
+                    if category["hierarchicalParent"] is not None
+                ]
+
             # Фильтруем товары с cost = null и формируем список категорий
             filtered_categories = [
                 {
@@ -72,7 +74,7 @@ class FoodService:
                     "hierarchicalId": food.get("hierarchicalId"),
                     # "hierarchicalParent":food.get("hierarchicalParent")
                 }
-                for food in foods['nomenclatures']
+                async for food in sbis.iter_foods(request, token)
                 if food.get('cost') is None and food.get("hierarchicalParent") != None  # Проверяем условия
             ]
             
@@ -121,6 +123,7 @@ class FoodService:
             if result.rowcount == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found for deletion")
             await session.commit()
+            await redis_service.invalidate_grouped_menu()
             return {"message": "Food deleted successfully"}
         except Exception as e:
             await session.rollback()
@@ -136,6 +139,7 @@ class FoodService:
             if result.rowcount == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found for update")
             await session.commit()
+            await redis_service.invalidate_grouped_menu()
             return {"message": "Food updated successfully"}
         except Exception as e:
             await session.rollback()
@@ -171,15 +175,13 @@ async def add_all_foods(
 # ):
 #     return await food_service.get_foods(session, category)
 
-sbis = SBISService()
-
 @foodRouter.get("/")
 async def get_foods(
     point_id: Optional[int] = None,
     price_list_id: Optional[int] = None,
     session: AsyncSession = Depends(get_async_session),
 ):
-    token: DTO.TokenValidation = await sbis.get_token(AuthorizationData(app_client_id=APP_CLIENT_ID, app_secret=APP_SECRET, app_secret_key=APP_SECRET_KEY))
+    token: DTO.TokenValidation = await sbis.get_token(auth_data)
     request = DTO.FoodsRequest(pointId=2378, priceListId=31)
     return await food_service.get_foods(request, token)
 
@@ -189,7 +191,7 @@ async def get_foods_categories(
     price_list_id: Optional[int] = None,
     session: AsyncSession = Depends(get_async_session),
 ):
-    token: DTO.TokenValidation = await sbis.get_token(AuthorizationData(app_client_id=APP_CLIENT_ID, app_secret=APP_SECRET, app_secret_key=APP_SECRET_KEY))
+    token: DTO.TokenValidation = await sbis.get_token(auth_data)
     request = DTO.FoodsRequest(pointId=2378, priceListId=31)
     return await food_service.get_foods_categories(request, token)
 
@@ -1,18 +1,37 @@
 import os
+import io
+import hmac
+import csv
 import json
-import requests
-from typing import List, Dict, Any
+import logging
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
-import redis
+from sqlalchemy import func, select, insert, update
 
-from auth.database import get_async_session
+from auth.database import async_session_maker, get_async_session
+from config import (
+    ORDERS_PAGE_SIZE, ORDERS_PAGE_MAX, ORDERS_EXPORT_BATCH, WS_ADMIN_TOKEN, WS_INIT_DATA_MAX_AGE
+)
+from services.shared import order_board, order_outbox, sales_rollup, telegram, ws_hub
+from services.order_board import OrderBoard
+from services.order_stream import OrderStream
+from services.redis_pool import get_redis, get_pool_stats
 from models.models import Order, User
 from dto import dto as DTO
+from utils.telegram_webapp import verify_init_data
+
+logger = logging.getLogger(__name__)
+
 
 class OrderService:
+    # События outbox, создаваемые вместе с заказом
+    CLIENT_CONFIRMATION = "client_confirmation"
+    ORDER_PUBLICATION = "order_publication"
+    LIVE_UPDATE = "live_update"
+
     def __init__(self):
         # Конфигурация Telegram
         self.TELEGRAM_BOT_TOKEN = os.environ.get(
@@ -23,12 +42,9 @@ class OrderService:
             'CLIENT_BOT_TOKEN', 
             '6937107637:AAFarU8swL-mp7oLC0sMz44A7-F3q0QuD4Y'
         )
-        # Подключение к Redis
-        self.redis_client = redis.Redis(
-            host=os.environ.get('REDIS_HOST', '127.0.0.1'),
-            port=int(os.environ.get('REDIS_PORT', 6379)),
-            decode_responses=True
-        )
+        # Подключение к Redis из общего пула
+        self.redis_client = get_redis()
+        self.order_stream = OrderStream(self.redis_client)
 
     def _format_telegram_message(self, order_dto: DTO.Order) -> str:
         """
@@ -56,27 +72,62 @@ class OrderService:
         
         return full_message
 
-    def _send_telegram_message(self, chat_id: int, message: str, token: str):
+    async def _send_telegram_message(self, chat_id: int, message: str, token: str, **kwargs):
         """
-        Отправка сообщения в Telegram
+        Отправка сообщения в Telegram через общую очередь с лимитами
         """
-        try:
-            requests.get(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                params={
-                    "chat_id": chat_id, 
-                    "text": message
-                }
-            )
-        except Exception as e:
-            print(f"Ошибка отправки в Telegram: {e}")
+        await telegram.send(token, chat_id, message, **kwargs)
+
+    async def deliver_client_confirmation(self, payload: Dict[str, Any]) -> None:
+        """
+        Подтверждение заказа клиенту (обработчик outbox). Неудачную отправку
+        повторяет outbox, поэтому очередь Telegram не повторяет ее сама
+        """
+        await self._send_telegram_message(payload["chat_id"], payload["text"], self.CLIENT_BOT_TOKEN,
+                                          max_retries=0)
+
+    async def publish_order(self, payload: Dict[str, Any]) -> None:
+        """
+        Публикация заказа в Redis для бота администраторов (обработчик outbox)
+        """
+        await self.order_stream.publish(payload)
+
+    async def publish_live_update(self, payload: Dict[str, Any]) -> None:
+        """
+        Событие заказа для клиентов WebSocket (обработчик outbox)
+        """
+        topics = [ws_hub.order_topic(payload["order_id"]), ws_hub.ADMINS]
+        if payload.get("user_id") is not None:
+            topics.append(ws_hub.user_topic(payload["user_id"]))
+        await ws_hub.publish(topics, payload["event"])
+
+    @staticmethod
+    def _filtered_query(filters: DTO.OrderFilter):
+        query = select(Order)
+        if filters.state is not None:
+            query = query.where(Order.state == filters.state)
+        if filters.isDelivery is not None:
+            query = query.where(Order.isDelivery == filters.isDelivery)
+        if filters.client is not None:
+            query = query.where(Order.client == filters.client)
+        if filters.date_from is not None:
+            query = query.where(Order.createdAt >= filters.date_from)
+        if filters.date_to is not None:
+            query = query.where(Order.createdAt < filters.date_to)
+        return query
 
-    async def get_all_orders(self, session: AsyncSession) -> List[Order]:
+    async def get_all_orders(self, session: AsyncSession, filters: DTO.OrderFilter,
+                             limit: int = ORDERS_PAGE_SIZE,
+                             before_id: Optional[int] = None) -> List[Order]:
         """
-        Получение всех заказов из базы данных
+        Страница заказов от новых к старым; следующая страница запрашивается
+        с before_id, равным id последнего заказа текущей
         """
         try:
-            query = select(Order)
+            query = self._filtered_query(filters)
+            if before_id is not None:
+                query = query.where(Order.id < before_id)
+            query = query.order_by(Order.id.desc()).limit(limit)
             result = await session.execute(query)
             return result.scalars().all()
         except Exception as e:
@@ -85,6 +136,44 @@ class OrderService:
                 detail=str(e)
             )
 
+    async def export_orders(self, filters: DTO.OrderFilter, fmt: str) -> AsyncIterator[str]:
+        """
+        Построчная выдача заказов через серверный курсор.
+
+        Сессия открывается здесь, а не берется из зависимости: зависимость
+        закрывается раньше, чем StreamingResponse дочитает генератор.
+        """
+        query = (
+            self._filtered_query(filters)
+            .order_by(Order.id)
+            .execution_options(yield_per=ORDERS_EXPORT_BATCH)
+        )
+        columns = [column.name for column in Order.__table__.columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+
+        async with async_session_maker() as session:
+            result = await session.stream_scalars(query)
+            async for partition in result.partitions():
+                for order in partition:
+                    row = {column: getattr(order, column) for column in columns}
+                    if fmt == "csv":
+                        writer.writerow([
+                            json.dumps(row[column], ensure_ascii=False, default=str)
+                            if isinstance(row[column], (list, dict)) else row[column]
+                            for column in columns
+                        ])
+                    else:
+                        buffer.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                yield chunk
+            if buffer.tell():
+                yield buffer.getvalue()
+
     async def save_to_redis(self, data: DTO.Order, session: AsyncSession) -> Dict[str, Any]:
         """
         Сохранение данных в Redis
@@ -96,9 +185,7 @@ class OrderService:
             print(chat_id)
             print(data)
             data.client = chat_id[0]["chatID"]
-            order_id = self.redis_client.incr("order_id")
-            redis_key = f"order:{order_id}"
-            self.redis_client.set(redis_key, json.dumps(data.model_dump()))
+            order_id = await self.order_stream.publish(data.model_dump())
             return {"status": "success", "order_id": order_id, "chat_id": chat_id}
         # return {"status": "success", "chat_id": chat_id}
         except Exception as e:
@@ -114,29 +201,68 @@ class OrderService:
         session: AsyncSession
     ):
         """
-        Полный процесс создания заказа:
-        1. Сохранение в базу данных
-        2. Отправка в Telegram
-        3. Сохранение в Redis
+        Создание заказа.
+
+        Заказ и его побочные действия (подтверждение клиенту, публикация
+        в Redis для бота администраторов) записываются одной транзакцией,
+        а доставляет их диспетчер outbox, поэтому ответ не ждет Telegram.
         """
-        # try:
-            # 1. Сохранение в базу данных
-        query = insert(Order).values(order_dto.model_dump())
-        result = await session.execute(query)
-        await session.commit()
-
-        # 2. Отправка в Telegram
-        telegram_message = self._format_telegram_message(order_dto)
-        
-        # Получаем chat ID администраторов для рассылки
-        admin_query = select(User.chatID).where(User.role == "admin")
-        admin_result = await session.execute(admin_query)
-        admin_chat_ids = os.getenv('ADMIN_CHAT_ID', '').split(' ')
+        try:
+            if not order_dto.state:
+                order_dto.state = OrderBoard.NEW
+            query = (
+                insert(Order)
+                .values(**order_dto.model_dump(), createdAt=func.now())
+                .returning(Order.id, Order.createdAt)
+            )
+            order_id, created_at = (await session.execute(query)).one()
+            # Сводки продаж обновляются в той же транзакции, что и заказ
+            await sales_rollup.apply(session, created_at, order_dto.total, order_dto.items)
 
-        # for admin_chat_id in admin_chat_ids:
-        #     self._send_telegram_message(admin_chat_id, telegram_message, self.TELEGRAM_BOT_TOKEN)
-        
-        text_for_send = (
+            # chatID клиента для бота берется в той же транзакции
+            chat_query = select(User.chatID).where(User.id == order_dto.client)
+            client_chat_id = (await session.execute(chat_query)).scalar_one_or_none()
+
+            order_outbox.add(session, order_id, self.CLIENT_CONFIRMATION, {
+                "chat_id": chatID,
+                "text": self._format_client_message(order_dto),
+            })
+            order_outbox.add(session, order_id, self.ORDER_PUBLICATION, {
+                **order_dto.model_dump(),
+                "id": order_id,
+                "client": client_chat_id,
+            })
+            order_outbox.add(session, order_id, self.LIVE_UPDATE, {
+                "order_id": order_id,
+                "user_id": order_dto.client,
+                "created_at": created_at.isoformat() if created_at else None,
+                "event": {"type": "order_created", "order": {**order_dto.model_dump(), "id": order_id}},
+            })
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+                detail=str(e)
+            )
+
+        # Доска заполняется после коммита и до диспетчера outbox: администраторы
+        # не увидят заказ раньше, чем он окажется на доске
+        try:
+            await order_board.add({**order_dto.model_dump(), "id": order_id}, created_at)
+        except Exception as e:
+            logger.error(f"Error adding order {order_id} to the board: {e}")
+
+        order_outbox.notify()
+        # Токен подписки на события заказа получает только тот, кто его создал
+        return {
+            "status": "success",
+            "order_number": order_dto.number,
+            "ws_token": ws_hub.sign(ws_hub.order_topic(order_id)),
+        }
+
+    def _format_client_message(self, order_dto: DTO.Order) -> str:
+        return (
             f"Спасибо за заказ!\n\n"
             f"Ваш заказ №{order_dto.number} принят и находится в обработке.\n"
             f"Он будет готов через 18 минут.\n\n"
@@ -152,61 +278,60 @@ class OrderService:
             f"💮🍜 "
         )
 
-        self._send_telegram_message(chatID, text_for_send, self.CLIENT_BOT_TOKEN)
-        # 3. Сохранение в Redis
-        await self.save_to_redis(order_dto, session)
-
-        return {"status": "success", "order_number": order_dto.number}
-
-        # except Exception as e:
-        #     await session.rollback()
-        #     raise HTTPException(
-        #         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-        #         detail=str(e)
-        #     )
-
-
-    def redis_health_check(self) -> Dict[str, str]:
+    async def redis_health_check(self) -> Dict[str, Any]:
         """
         Проверка работоспособности Redis
         """
         try:
-            self.redis_client.ping()
-            return {"status": "ok", "message": "Redis is working"}
+            await self.redis_client.ping()
+            return {"status": "ok", "message": "Redis is working", "pool": get_pool_stats()}
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
                 detail=str(e)
             )
+    async def change_state(self, order_id: int, state: str, reason: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Смена состояния заказа: БД (с проверкой перехода), затем доска и событие
+        для клиентов WebSocket. Доска меняется только после коммита, поэтому
+        несуществующий заказ или ошибка БД ее не затрагивают
+        """
+        async with async_session_maker() as session:
+            query = select(Order.state, Order.client).where(Order.id == order_id).with_for_update()
+            row = (await session.execute(query)).one_or_none()
+            if row is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+            OrderBoard.check_transition(order_id, row.state, state)
+            await session.execute(update(Order).where(Order.id == order_id).values(state=state))
+            await session.commit()
+        previous = row.state
+
+        try:
+            await order_board.transition(order_id, state, force=True)
+        except Exception as e:
+            logger.error(f"Error moving order {order_id} to {state} on the board: {e}")
+
+        event = {"type": "order_status", "order_id": order_id, "state": state, "previous": previous}
+        if reason:
+            event["reason"] = reason
+        await self.publish_live_update({"order_id": order_id, "user_id": row.client, "event": event})
+        return event
+
     async def send_message(self, message: str, client: int, session: AsyncSession):
         """
         Отправка сообщения в Telegram
         """
         try:
-            self._send_telegram_message(client, message, self.CLIENT_BOT_TOKEN)
+            await self._send_telegram_message(client, message, self.CLIENT_BOT_TOKEN)
             return {"status": "success"}
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-class OrderWebsocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-manager = OrderWebsocketManager()
-
-
 # Создаем сервис
 order_service = OrderService()
+order_outbox.register(OrderService.CLIENT_CONFIRMATION, order_service.deliver_client_confirmation)
+order_outbox.register(OrderService.ORDER_PUBLICATION, order_service.publish_order)
+order_outbox.register(OrderService.LIVE_UPDATE, order_service.publish_live_update)
 
 # Создаем роутер
 orderRouter = APIRouter()
@@ -224,12 +349,35 @@ async def create_order(
 
 @orderRouter.get("/")
 async def get_orders(
+    response: Response,
+    filters: DTO.OrderFilter = Depends(),
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_PAGE_MAX),
+    before_id: Optional[int] = None,
     session: AsyncSession = Depends(get_async_session)
 ):
     """
-    Получение всех заказов из базы данных
+    Получение заказов постранично, от новых к старым.
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor
+    """
+    orders = await order_service.get_all_orders(session, filters, limit, before_id)
+    if len(orders) == limit:
+        response.headers["X-Next-Cursor"] = str(orders[-1].id)
+    return orders
+
+@orderRouter.get("/export")
+async def export_orders(
+    filters: DTO.OrderFilter = Depends(),
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    """
+    Выгрузка всех заказов по фильтрам потоком в NDJSON или CSV
     """
-    return await order_service.get_all_orders(session)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        order_service.export_orders(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
 
 @orderRouter.post("/redis")
 async def save_to_redis(data: DTO.Order, session: AsyncSession = Depends(get_async_session)):
@@ -238,47 +386,124 @@ async def save_to_redis(data: DTO.Order, session: AsyncSession = Depends(get_asy
     """
     return await order_service.save_to_redis(data, session)
 
+@orderRouter.get("/board")
+async def get_board():
+    """
+    Активные заказы по состояниям, от старых к новым
+    """
+    return await order_board.get_board()
+
+@orderRouter.patch("/{order_id}/state")
+async def change_order_state(order_id: int, data: DTO.OrderStateChange):
+    """
+    Перевод заказа в другое состояние (accepted, cooking, ready, delivering,
+    completed, declined, cancelled)
+    """
+    return await order_service.change_state(order_id, data.state, data.reason)
+
 @orderRouter.get("/redis/health")
 async def redis_health():
     """
     Проверка работоспособности Redis
     """
-    return order_service.redis_health_check()
+    return await order_service.redis_health_check()
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+@orderRouter.get("/outbox/stats")
+async def outbox_stats():
+    """
+    Статистика доставки побочных действий заказов
+    """
+    return {**order_outbox.get_stats(), "telegram": telegram.get_stats()}
 
-    async def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+def _allowed_topic(topic: str, is_admin: bool, token: Any) -> bool:
+    # Темы заказа и пользователя содержат личные данные: нужен токен темы,
+    # администраторам доступны все темы
+    kind, _, value = topic.partition(":")
+    if topic == ws_hub.ADMINS:
+        return is_admin
+    if kind not in ("order", "user") or not value.isdigit():
+        return False
+    return is_admin or ws_hub.verify(topic, token)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-            print(connection)
+@orderRouter.get("/ws/token")
+async def websocket_token(init_data: str, session: AsyncSession = Depends(get_async_session)):
+    """
+    Токен подписки на тему user:<id>. Владелец подтверждается подписанными
+    Telegram данными Mini App (initData) клиентского бота
+    """
+    telegram_user = verify_init_data(init_data, order_service.CLIENT_BOT_TOKEN, WS_INIT_DATA_MAX_AGE)
+    if telegram_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid init data")
+    query = select(User.id).where(User.chatID == str(telegram_user["id"]))
+    user_id = (await session.execute(query)).scalars().first()
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    topic = ws_hub.user_topic(user_id)
+    token = ws_hub.sign(topic)
+    if token is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="WebSocket tokens are not configured")
+    return {"user_id": user_id, "topic": topic, "token": token}
 
 
-manager = ConnectionManager()
 @orderRouter.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.disconnect(websocket)
-    # try:
-    #     while True:
-    #         global currentPayment
-    #         currentPayment = {}
-    #         data = await websocket.receive_text()
-    #         print(data)
-    #         await manager.broadcast(f'[{data},'.join(json.dumps(currentPayment)) + ']')
-    #         print(currentPayment)
-            
-    # except WebSocketDisconnect:
-    #     await manager.disconnect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    order_id: Optional[int] = None,
+    order_token: Optional[str] = None,
+    user_id: Optional[int] = None,
+    user_token: Optional[str] = None,
+    admin_token: Optional[str] = None,
+):
+    """
+    Живые события заказов. Начальные темы задаются параметрами с токенами
+    (ws_token из ответа на создание заказа, токен из /order/ws/token), дальше
+    клиент может отправлять {"subscribe": "order:<id>", "token": "..."}
+    и {"unsubscribe": "order:<id>"}
+    """
+    is_admin = bool(WS_ADMIN_TOKEN) and hmac.compare_digest(admin_token or "", WS_ADMIN_TOKEN)
+    requested = []
+    if order_id is not None:
+        requested.append((ws_hub.order_topic(order_id), order_token))
+    if user_id is not None:
+        requested.append((ws_hub.user_topic(user_id), user_token))
+    if not all(_allowed_topic(topic, is_admin, token) for topic, token in requested):
+        # 1008 Policy Violation: нет права на запрошенную тему
+        await websocket.close(code=1008)
+        return
+    topics = [topic for topic, _ in requested]
+    if is_admin:
+        topics.append(ws_hub.ADMINS)
+
+    connection = await ws_hub.connect(websocket, topics)
+    try:
+        while True:
+            try:
+                command = await websocket.receive_json()
+            except ValueError:
+                continue
+            if not isinstance(command, dict):
+                continue
+            topic = command.get("subscribe")
+            token = command.get("token")
+            if isinstance(topic, str) and _allowed_topic(topic, is_admin, token):
+                ws_hub.subscribe(connection, topic)
+            topic = command.get("unsubscribe")
+            if isinstance(topic, str):
+                ws_hub.unsubscribe(connection, topic)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await ws_hub.disconnect(connection)
+
+
+@orderRouter.get("/ws/stats")
+async def websocket_stats():
+    """
+    Статистика хаба WebSocket текущего воркера
+    """
+    return ws_hub.get_stats()
 
 
 @orderRouter.post("/send-message")
@@ -0,0 +1,55 @@
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.database import get_async_session
+from services.shared import sales_rollup
+
+reportsRouter = APIRouter()
+
+
+def _check_period(date_from: date, date_to: date) -> None:
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must not be later than date_to"
+        )
+
+
+@reportsRouter.get("/summary")
+async def sales_summary(
+    date_from: date,
+    date_to: date,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Выручка, число заказов, блюд и средний чек за период с разбивкой по дням
+    """
+    _check_period(date_from, date_to)
+    return await sales_rollup.summary(session, date_from, date_to)
+
+@reportsRouter.get("/hourly")
+async def sales_hourly(
+    day: date,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Продажи за день по часам
+    """
+    return await sales_rollup.hourly(session, day)
+
+@reportsRouter.get("/top-products")
+async def top_products(
+    date_from: date,
+    date_to: date,
+    limit: int = Query(10, ge=1, le=100),
+    by: Literal["quantity", "revenue"] = "quantity",
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Самые продаваемые блюда за период по количеству или выручке
+    """
+    _check_period(date_from, date_to)
+    return await sales_rollup.top_products(session, date_from, date_to, limit, by)
@@ -11,6 +11,7 @@ from routers.payment import payment_router
 from routers.promocode import promoRouter
 from routers.sbis import sbisRouter
 from routers.cart import cart_router
+from routers.reports import reportsRouter
 
 import uuid
 
@@ -39,4 +40,5 @@ router.include_router(orderRouter, prefix='/order', tags=["Заказы"])
 router.include_router(payment_router, prefix='/payments', tags=["Оплата"])
 router.include_router(promoRouter, prefix='/promocode', tags=["Промокоды"])
 router.include_router(sbisRouter, prefix='/sbis', tags=["SBIS"])
-router.include_router(cart_router, prefix="/cart", tags=["Корзина"])
\ No newline at end of file
+router.include_router(cart_router, prefix="/cart", tags=["Корзина"])
+router.include_router(reportsRouter, prefix="/reports", tags=["Отчеты"])
\ No newline at end of file
@@ -1,15 +1,11 @@
 import logging
 import os
 from typing import Dict, List
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 
-from services import redis_service
-from services.sbis import SBISService, SBISBusinessLogic
-from services.sbis import SBISService as sbis_service
-from exceptions.sbis import SBISAuthError, SBISRequestError
-from main import auth_data
-
-sbis_logic = SBISBusinessLogic(sbis_service, redis_service.RedisService())
+from services.shared import auth_data, sbis_service, sbis_logic, sync_scheduler
+from services.redis_pool import get_pool_stats
+from exceptions.sbis import SBISAuthError, SBISRequestError, SBISUnavailableError
 
 logging.basicConfig(level=logging.INFO)
 sbisRouter = APIRouter()
@@ -17,14 +13,12 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 async def get_sbis_service():
-    async with SBISService() as service:
-        yield service
+    yield sbis_service
 
 @sbisRouter.post('/register')
 async def register() -> Dict:
     try:
-        async with SBISService() as service:
-            return await sbis_logic.get_point_info(auth_data)
+        return await sbis_logic.get_point_info(auth_data)
     except SBISAuthError as e:
         logger.error(f"Authentication failed: {str(e)}")
         raise HTTPException(
@@ -47,8 +41,7 @@ async def register() -> Dict:
 @sbisRouter.get("/categories")
 async def get_categories() -> List[Dict]:
     try:
-        async with SBISService() as service:
-            return await sbis_logic.get_all_categories(auth_data)
+        return await sbis_logic.get_all_categories(auth_data)
     except SBISAuthError as e:
         logger.error(f"Authentication failed: {str(e)}")
         raise HTTPException(
@@ -68,10 +61,34 @@ async def get_categories() -> List[Dict]:
             detail="Internal server error"
         )
 
+@sbisRouter.get("/categories/tree")
+async def get_category_tree() -> List[Dict]:
+    return await sbis_logic.get_category_tree()
+
+@sbisRouter.get("/categories/flat")
+async def get_category_list() -> List[Dict]:
+    return await sbis_logic.get_category_list()
+
 @sbisRouter.get("/sbis-products")
-async def get_kitchen_products() -> List[Dict]:
+async def get_kitchen_products(request: Request) -> Response:
     try:
-        return await sbis_logic.get_kitchen_products(auth_data)
+        payload, stale = await sbis_logic.get_menu_payload(auth_data)
+        headers = {
+            "ETag": payload.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            "X-Catalog-Stale": "true" if stale else "false",
+        }
+        if payload.matches(request.headers.get("if-none-match")):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        body, encoding = payload.select(request.headers.get("accept-encoding"))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    except SBISUnavailableError as e:
+        logger.error(f"SBIS unavailable and no cached menu: {e}")
+        raise
     except Exception as e:
         logger.error(f"Failed to get products: {e}")
         raise HTTPException(
@@ -79,11 +96,21 @@ async def get_kitchen_products() -> List[Dict]:
             detail=str(e)
         )
 
+@sbisRouter.get("/sbis-products/search")
+async def search_products(name: str) -> List[Dict]:
+    return await sbis_logic.search_products(name)
+
+@sbisRouter.get("/categories/{category_id}/products")
+async def get_category_products(category_id: int) -> List[Dict]:
+    return await sbis_logic.get_category_products(category_id)
+
 @sbisRouter.get("/sbis-product/{product_id}")
 async def get_product_by_id(product_id: int) -> Dict:
     try:
-        async with SBISService() as service:
-            return await sbis_logic.get_product_details(auth_data, product_id)
+        return await sbis_logic.get_product_details(auth_data, product_id)
+    except SBISUnavailableError as e:
+        logger.error(f"SBIS unavailable: {str(e)}")
+        raise
     except SBISAuthError as e:
         logger.error(f"Authentication failed: {str(e)}")
         raise HTTPException(
@@ -102,3 +129,19 @@ async def get_product_by_id(product_id: int) -> Dict:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
+
+@sbisRouter.get("/stats")
+async def get_sbis_stats() -> Dict:
+    return {
+        "requests": sbis_service.get_request_stats(),
+        "breaker": sbis_service.breaker.get_stats(),
+        "sync": await sbis_logic.redis.get_products_sync_stats(),
+        "scheduler": await sync_scheduler.get_status(),
+        "redis": get_pool_stats(),
+        "catalog_cache": sbis_logic.get_cache_stats(),
+    }
+
+@sbisRouter.post("/metadata/invalidate")
+async def invalidate_metadata() -> Dict:
+    await sbis_logic.metadata.invalidate()
+    return {"status": "success"}
@@ -0,0 +1,73 @@
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class CatalogIndex:
+    """
+    Индекс меню в памяти процесса, перестраивается после каждой синхронизации.
+
+    Товары хранятся один раз в кортеже, а индексы по id, категории и названию
+    ссылаются на позиции в нем, поэтому поиск товара не требует обращения
+    ни к Redis, ни к СБИС. Товары упорядочены по id: порядок ответа СБИС
+    и HGETALL различается, а меню и его ETag должны совпадать во всех воркерах.
+    """
+
+    __slots__ = ("version", "_products", "_by_id", "_by_parent", "_by_name")
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = (), version: Optional[int] = None):
+        self.version = version
+        self._products = tuple(sorted(products, key=lambda product: product["id"]))
+        self._by_id: Dict[int, int] = {}
+        self._by_parent: Dict[Any, array] = {}
+        self._by_name: Dict[str, array] = {}
+
+        for position, product in enumerate(self._products):
+            self._by_id[product["id"]] = position
+            self._by_parent.setdefault(product.get("category"), array("I")).append(position)
+            self._by_name.setdefault(self._name_key(product.get("name")), array("I")).append(position)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def __bool__(self) -> bool:
+        return bool(self._products)
+
+    @staticmethod
+    def _name_key(name: Optional[str]) -> str:
+        return (name or "").strip().casefold()
+
+    def products(self) -> List[Dict[str, Any]]:
+        return list(self._products)
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        position = self._by_id.get(product_id)
+        return self._products[position] if position is not None else None
+
+    def by_category(self, category_id: int) -> List[Dict[str, Any]]:
+        return [self._products[position] for position in self._by_parent.get(category_id, ())]
+
+    def by_name(self, name: str) -> List[Dict[str, Any]]:
+        return [self._products[position] for position in self._by_name.get(self._name_key(name), ())]
+
+
+class CatalogIndexBuilder:
+    """
+    Собирает CatalogIndex по мере чтения страниц номенклатуры.
+
+    Товары сразу складываются в хранилище будущего индекса, а число товаров
+    по категориям считается на лету, поэтому синхронизация не держит
+    отдельный список меню рядом с индексом.
+    """
+
+    def __init__(self):
+        self._products: List[Dict[str, Any]] = []
+        self.category_counts: Counter = Counter()
+
+    def add(self, product: Dict[str, Any]) -> None:
+        self._products.append(product)
+        self.category_counts[product.get("category")] += 1
+
+    def build(self, version: Optional[int] = None) -> CatalogIndex:
+        products, self._products = self._products, []
+        return CatalogIndex(products, version)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+
+class CategoryTree:
+    """
+    Дерево категорий меню, построенное по hierarchicalId/hierarchicalParent.
+
+    Строится один раз за синхронизацию: дочерние категории заранее
+    отсортированы, количество товаров посчитано с учетом вложенных
+    категорий, а ответы эндпоинтов подготовлены, поэтому чтение не требует
+    просмотра номенклатуры.
+    """
+
+    __slots__ = ("version", "digest", "_nodes", "_roots", "_excluded", "_flat", "_tree")
+
+    def __init__(self, nodes: Optional[Dict[int, Dict[str, Any]]] = None,
+                 roots: Iterable[int] = (), excluded: Iterable[int] = (),
+                 version: Optional[int] = None):
+        self.version = version
+        self._nodes = nodes or {}
+        self._roots = [node_id for node_id in roots if node_id in self._nodes]
+        self._excluded = set(excluded)
+        top_level = sorted(
+            (node_id for node_id, node in self._nodes.items() if node["parent"] not in self._nodes),
+            key=lambda node_id: self._sort_key(self._nodes[node_id])
+        )
+        self._flat = [self._row(node) for node in self._walk(top_level)]
+        self._tree = [self._subtree(node_id) for node_id in self._roots]
+        self.digest = hashlib.sha1(
+            json.dumps(self._flat, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+
+    def __bool__(self) -> bool:
+        return bool(self._nodes)
+
+    @classmethod
+    def build(cls, categories: Iterable[Dict[str, Any]], product_counts: Mapping[Any, int],
+              roots: Iterable[int] = (), excluded: Iterable[int] = (),
+              version: Optional[int] = None) -> "CategoryTree":
+        nodes: Dict[int, Dict[str, Any]] = {
+            category["id"]: {
+                "id": category["id"],
+                "name": category.get("name"),
+                "parent": category.get("parent"),
+                "children": [],
+                "product_count": 0,
+                "total_count": 0,
+            }
+            for category in categories
+        }
+        for node in nodes.values():
+            parent = nodes.get(node["parent"])
+            if parent is not None:
+                parent["children"].append(node["id"])
+
+        # Исключенные категории убираются вместе со всем поддеревом
+        excluded_ids = set()
+        stack = [node_id for node_id in excluded if node_id in nodes]
+        while stack:
+            node_id = stack.pop()
+            excluded_ids.add(node_id)
+            stack.extend(nodes[node_id]["children"])
+        for node_id in excluded_ids:
+            del nodes[node_id]
+        for node in nodes.values():
+            node["children"] = sorted(
+                (child_id for child_id in node["children"] if child_id in nodes),
+                key=lambda child_id: cls._sort_key(nodes[child_id])
+            )
+
+        # product_counts - число товаров по id категории, посчитанное при чтении номенклатуры
+        for category_id, count in product_counts.items():
+            node = nodes.get(category_id)
+            if node is not None:
+                node["product_count"] += count
+
+        def rollup(node_id: int) -> int:
+            node = nodes[node_id]
+            node["total_count"] = node["product_count"] + sum(
+                rollup(child_id) for child_id in node["children"]
+            )
+            return node["total_count"]
+
+        top_level = sorted(
+            (node_id for node_id, node in nodes.items() if node["parent"] not in nodes),
+            key=lambda node_id: cls._sort_key(nodes[node_id])
+        )
+        for node_id in top_level:
+            rollup(node_id)
+
+        roots = [node_id for node_id in roots if node_id in nodes] or top_level
+        return cls(nodes, roots, excluded_ids | set(excluded), version)
+
+    @staticmethod
+    def _sort_key(node: Dict[str, Any]) -> str:
+        return (node["name"] or "").casefold()
+
+    def _walk(self, node_ids: List[int]):
+        stack = list(reversed(node_ids))
+        while stack:
+            node = self._nodes[stack.pop()]
+            yield node
+            stack.extend(reversed(node["children"]))
+
+    @staticmethod
+    def _row(node: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "hierarchicalId": node["id"],
+            "hierarchicalParent": node["parent"],
+            "name": node["name"],
+            "product_count": node["product_count"],
+            "total_count": node["total_count"],
+        }
+
+    def _subtree(self, node_id: int) -> Dict[str, Any]:
+        node = self._nodes[node_id]
+        return {
+            **self._row(node),
+            "children": [self._subtree(child_id) for child_id in node["children"]],
+        }
+
+    def flat(self) -> List[Dict[str, Any]]:
+        """Все категории дерева в порядке обхода."""
+        return self._flat
+
+    def tree(self) -> List[Dict[str, Any]]:
+        """Вложенное дерево от корневых категорий."""
+        return self._tree
+
+    def is_excluded(self, node_id: Optional[int]) -> bool:
+        return node_id in self._excluded
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "roots": self._roots,
+            "excluded": sorted(self._excluded),
+            "nodes": list(self._nodes.values()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CategoryTree":
+        nodes = {node["id"]: node for node in data.get("nodes", [])}
+        return cls(nodes, data.get("roots", []), data.get("excluded", []), data.get("version"))
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout
+
+from config import (
+    IMAGE_MIRROR_DIR, IMAGE_MIRROR_URL, IMAGE_MIRROR_WORKERS, IMAGE_MIRROR_CONCURRENCY,
+    IMAGE_MIRROR_TIMEOUT
+)
+from services.redis_service import RedisService
+from utils.images import render_variants
+
+logger = logging.getLogger(__name__)
+
+
+class ImageMirror:
+    """
+    Зеркалирование фотографий товаров СБИС в /static.
+
+    Новые и измененные фото скачиваются параллельно, уменьшенные WebP-копии
+    строятся в пуле процессов, а ссылки в товарах заменяются на локальные.
+
+    Фото скачиваются своей сессией, без повторов и без предохранителя СБИС:
+    недоступные картинки не открывают предохранитель и не тормозят
+    синхронизацию меню, а попытка повторится при следующей синхронизации.
+    """
+
+    def __init__(self, redis_service: RedisService,
+                 directory: str = IMAGE_MIRROR_DIR, base_url: str = IMAGE_MIRROR_URL,
+                 workers: int = IMAGE_MIRROR_WORKERS,
+                 concurrency: int = IMAGE_MIRROR_CONCURRENCY,
+                 timeout: float = IMAGE_MIRROR_TIMEOUT):
+        self.redis = redis_service
+        self.directory = os.path.abspath(directory)
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.batch_size = concurrency * 4
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = ClientTimeout(total=timeout)
+        self._session: Optional[ClientSession] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._variants: Optional[Dict[str, Dict[str, str]]] = None
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def _download(self, url: str) -> bytes:
+        async with self._get_session().get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def mirror(self, products: AsyncIterable[Dict]) -> AsyncIterator[Dict]:
+        batch: List[Dict] = []
+        async for product in products:
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                for mirrored in await asyncio.gather(*(self._rewrite(p) for p in batch)):
+                    yield mirrored
+                batch = []
+        for mirrored in await asyncio.gather(*(self._rewrite(p) for p in batch)):
+            yield mirrored
+
+    async def _rewrite(self, product: Dict) -> Dict:
+        source = product.get("image")
+        if not source:
+            return product
+
+        variants = await self._get_variants(source)
+        if not variants:
+            # Если зеркалирование не удалось, оставляем исходную ссылку
+            return product
+        return {
+            **product,
+            "image": self._url(variants["card"]),
+            "thumbnail": self._url(variants["thumb"]),
+        }
+
+    async def _get_variants(self, source: str) -> Optional[Dict[str, str]]:
+        if self._variants is None:
+            self._variants = await self.redis.get_image_variants()
+
+        variants = self._variants.get(source)
+        if variants and all(
+            os.path.exists(os.path.join(self.directory, path)) for path in variants.values()
+        ):
+            return variants
+
+        async with self._semaphore:
+            try:
+                data = await self._download(source)
+                digest = hashlib.sha256(data).hexdigest()
+                loop = asyncio.get_running_loop()
+                variants = await loop.run_in_executor(
+                    self._get_pool(), render_variants, data, self.directory, digest
+                )
+            except Exception as e:
+                logger.error(f"Failed to mirror image {source}: {e}")
+                return None
+
+        self._variants[source] = variants
+        await self.redis.set_image_variants(source, variants)
+        return variants
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
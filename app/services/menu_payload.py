@@ -0,0 +1,61 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class MenuPayload:
+    """
+    Готовый ответ /sbis/sbis-products для одной версии меню.
+
+    JSON собирается и сжимается один раз после синхронизации, а запросы
+    получают уже готовые байты в подходящей кодировке. ETag считается по
+    несжатому телу, поэтому он одинаков во всех воркерах: товары приходят
+    отсортированными по id, а ключи сериализуются по алфавиту, ведь после
+    декодирования из Redis их порядок не совпадает с порядком у лидера.
+    """
+
+    __slots__ = ("version", "etag", "_bodies")
+
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 9
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = (), version: Optional[int] = None):
+        self.version = version
+        raw = json.dumps(list(products), ensure_ascii=False, sort_keys=True,
+                         separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha1(raw).hexdigest()}"'
+        self._bodies = {"identity": raw, "gzip": gzip.compress(raw, self.GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self._bodies["br"] = brotli.compress(raw, quality=self.BROTLI_QUALITY)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[bytes, str]:
+        accepted = self._accepted(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self._bodies and encoding in accepted:
+                return self._bodies[encoding], encoding
+        return self._bodies["identity"], "identity"
+
+    @staticmethod
+    def _accepted(accept_encoding: Optional[str]) -> set:
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, _, params = part.strip().partition(";")
+            params = params.replace(" ", "")
+            if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(coding.lower())
+        return accepted
+
+    def sizes(self) -> Dict[str, int]:
+        return {encoding: len(body) for encoding, body in self._bodies.items()}
@@ -0,0 +1,219 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from redis.asyncio import Redis
+
+from config import ORDER_BOARD_MAX_AGE, REDIS_CODEC
+from exceptions.order import OrderStateError
+from services.redis_pool import get_redis
+from utils.serialization import Codec, dumps, get_codec, loads
+
+logger = logging.getLogger(__name__)
+
+# Заказ добавляется, только если его еще нет на доске: повторный вызов
+# не вернет уже принятый заказ в состояние new
+BOARD_ADD_SCRIPT = """
+if redis.call('hsetnx', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('hset', KEYS[2], ARGV[1], ARGV[4])
+redis.call('zadd', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+
+# Переход проверяется и выполняется атомарно. Ответ: {1, прежнее состояние},
+# {0, текущее состояние} если переход запрещен, {0, false} если заказа нет на доске.
+# Все множества состояний передаются в KEYS[3..], их имена - в ARGV[6..5 + ARGV[5]],
+# за ними - состояния, из которых переход разрешен.
+# ARGV[4] = '1' переводит заказ без проверки (состояние уже записано в БД)
+BOARD_TRANSITION_SCRIPT = """
+local current = redis.call('hget', KEYS[1], ARGV[1])
+if not current then
+    return {0, false}
+end
+if current == ARGV[2] then
+    return {1, current}
+end
+local count = tonumber(ARGV[5])
+local zsets = {}
+for i = 1, count do
+    zsets[ARGV[5 + i]] = KEYS[2 + i]
+end
+local allowed = ARGV[4] == '1'
+for i = 6 + count, #ARGV do
+    if ARGV[i] == current then
+        allowed = true
+    end
+end
+if not allowed then
+    return {0, current}
+end
+local score
+local source = zsets[current]
+if source then
+    score = redis.call('zscore', source, ARGV[1])
+    redis.call('zrem', source, ARGV[1])
+end
+if ARGV[3] == '1' then
+    redis.call('hdel', KEYS[1], ARGV[1])
+    redis.call('hdel', KEYS[2], ARGV[1])
+else
+    redis.call('zadd', zsets[ARGV[2]], score or 0, ARGV[1])
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+end
+return {1, current}
+"""
+
+# Вся доска за один вызов: устаревшие заказы снимаются, для каждого
+# состояния возвращаются пары id/время создания и снимки заказов
+BOARD_GET_SCRIPT = """
+local board = {}
+for i = 3, #KEYS do
+    local expired = redis.call('zrangebyscore', KEYS[i], '-inf', '(' .. ARGV[1])
+    for _, order_id in ipairs(expired) do
+        redis.call('zrem', KEYS[i], order_id)
+        redis.call('hdel', KEYS[1], order_id)
+        redis.call('hdel', KEYS[2], order_id)
+    end
+    local entries = redis.call('zrange', KEYS[i], 0, -1, 'WITHSCORES')
+    local snapshots = {}
+    for j = 1, #entries, 2 do
+        snapshots[#snapshots + 1] = redis.call('hget', KEYS[2], entries[j]) or ''
+    end
+    board[#board + 1] = {entries, snapshots}
+end
+return board
+"""
+
+
+class OrderBoard:
+    """
+    Доска активных заказов для кухни и менеджера.
+
+    Для каждого активного состояния хранится сортированное множество
+    order_board:<state> с временем создания в качестве веса, снимки заказов
+    лежат в хэше order_board:orders, текущие состояния - в order_board:states.
+    Доска читается одним вызовом скрипта за O(активных заказов); заказ
+    в конечном состоянии снимается с доски.
+    """
+
+    ZSET_PREFIX = "order_board:"
+    STATES_KEY = "order_board:states"
+    ORDERS_KEY = "order_board:orders"
+
+    NEW = "new"
+    ACCEPTED = "accepted"
+    COOKING = "cooking"
+    READY = "ready"
+    DELIVERING = "delivering"
+    COMPLETED = "completed"
+    DECLINED = "declined"
+    CANCELLED = "cancelled"
+
+    ACTIVE = (NEW, ACCEPTED, COOKING, READY, DELIVERING)
+    TERMINAL = (COMPLETED, DECLINED, CANCELLED)
+    # Из каких состояний можно перейти в данное
+    TRANSITIONS = {
+        ACCEPTED: (NEW,),
+        COOKING: (NEW, ACCEPTED),
+        READY: (ACCEPTED, COOKING),
+        DELIVERING: (READY,),
+        COMPLETED: (READY, DELIVERING),
+        DECLINED: (NEW,),
+        CANCELLED: (NEW, ACCEPTED, COOKING, READY),
+    }
+
+    # Поля заказа, которые нужны доске
+    SNAPSHOT_FIELDS = ("id", "number", "items", "total", "address", "isDelivery",
+                       "payment", "comment", "cutlery", "client", "date")
+
+    def __init__(self, client: Optional[Redis] = None, codec: Optional[Codec] = None,
+                 max_age: int = ORDER_BOARD_MAX_AGE):
+        self._client = client
+        self._codec = codec
+        self.max_age = max_age
+        self._scripts: Dict[str, Any] = {}
+
+    @property
+    def redis(self) -> Redis:
+        # Клиент берется при первом обращении, чтобы доску можно было создать при импорте
+        if self._client is None:
+            self._client = get_redis()
+        return self._client
+
+    @property
+    def codec(self) -> Codec:
+        if self._codec is None:
+            self._codec = get_codec(REDIS_CODEC)
+        return self._codec
+
+    def _script(self, source: str):
+        if source not in self._scripts:
+            self._scripts[source] = self.redis.register_script(source)
+        return self._scripts[source]
+
+    def _zset_key(self, state: str) -> str:
+        return f"{self.ZSET_PREFIX}{state}"
+
+    async def add(self, order: Dict[str, Any], created_at: Optional[datetime] = None) -> bool:
+        """Ставит заказ на доску в состоянии new; False - заказ уже на доске."""
+        snapshot = {field: order.get(field) for field in self.SNAPSHOT_FIELDS}
+        score = created_at.timestamp() if created_at else time.time()
+        added = await self._script(BOARD_ADD_SCRIPT)(
+            keys=[self.STATES_KEY, self.ORDERS_KEY, self._zset_key(self.NEW)],
+            args=[order["id"], self.NEW, score, dumps({**snapshot, "created_at": score}, self.codec)],
+        )
+        return bool(added)
+
+    @classmethod
+    def check_transition(cls, order_id: int, current: Optional[str], state: str) -> None:
+        """
+        Проверяет переход current -> state, OrderStateError - переход запрещен.
+        Состояния вне схемы доски (старые заказы) переходу не мешают.
+        """
+        if state not in cls.TRANSITIONS:
+            raise OrderStateError(order_id, "any", state)
+        if current in cls.ACTIVE or current in cls.TERMINAL:
+            if current != state and current not in cls.TRANSITIONS[state]:
+                raise OrderStateError(order_id, current, state)
+
+    async def transition(self, order_id: int, state: str, force: bool = False) -> Optional[str]:
+        """
+        Переводит заказ в состояние state и возвращает прежнее состояние
+        или None, если заказа нет на доске. Запрещенный переход - OrderStateError;
+        force=True переводит без проверки, чтобы доска догнала состояние из БД.
+        """
+        if state not in self.TRANSITIONS:
+            raise OrderStateError(order_id, "any", state)
+        moved, current = await self._script(BOARD_TRANSITION_SCRIPT)(
+            keys=[self.STATES_KEY, self.ORDERS_KEY, *(self._zset_key(active) for active in self.ACTIVE)],
+            args=[order_id, state, int(state in self.TERMINAL), int(force), len(self.ACTIVE),
+                  *self.ACTIVE, *self.TRANSITIONS[state]],
+        )
+        if not moved and current:
+            raise OrderStateError(order_id, current, state)
+        return current
+
+    async def get_board(self) -> Dict[str, List[Dict[str, Any]]]:
+        cutoff = time.time() - self.max_age
+        response = await self._script(BOARD_GET_SCRIPT)(
+            keys=[self.STATES_KEY, self.ORDERS_KEY, *(self._zset_key(state) for state in self.ACTIVE)],
+            args=[cutoff],
+        )
+        board = {}
+        for state, (entries, snapshots) in zip(self.ACTIVE, response):
+            orders = []
+            for index, snapshot in enumerate(snapshots):
+                order = loads(snapshot) if snapshot else {"id": int(entries[index * 2])}
+                order["state"] = state
+                orders.append(order)
+            board[state] = orders
+        return board
+
+    async def get_counts(self) -> Dict[str, int]:
+        pipe = self.redis.pipeline(transaction=False)
+        for state in self.ACTIVE:
+            pipe.zcard(self._zset_key(state))
+        return dict(zip(self.ACTIVE, await pipe.execute()))
@@ -0,0 +1,106 @@
+import logging
+import os
+import socket
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from config import (
+    REDIS_CODEC, ORDERS_STREAM_MAXLEN, ORDERS_STREAM_GROUP,
+    ORDERS_STREAM_BLOCK, ORDERS_STREAM_CLAIM_IDLE
+)
+from services.redis_pool import get_redis
+from utils.serialization import Codec, dumps, get_codec, loads
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[str, Dict[str, Any]]
+
+
+class OrderStream:
+    """
+    Поток новых заказов в Redis Streams.
+
+    Заказы добавляются XADD с ограничением длины, бот читает их через группу
+    потребителей: каждый заказ получает один экземпляр бота, подтверждение
+    XACK снимает его с ожидания, а неподтвержденные заказы упавшего
+    экземпляра забирает XAUTOCLAIM. Чаты, которым заказ уже доставлен,
+    запоминаются, чтобы повторная доставка шла только в оставшиеся.
+    """
+
+    STREAM_KEY = "orders_stream"
+    DELIVERY_KEY = "orders_stream_delivery:{entry_id}"
+    DELIVERY_TTL = 86400
+
+    def __init__(self, client: Optional[Redis] = None, codec: Optional[Codec] = None,
+                 group: str = ORDERS_STREAM_GROUP, maxlen: int = ORDERS_STREAM_MAXLEN,
+                 consumer: Optional[str] = None):
+        self.redis = client or get_redis()
+        self.codec = codec or get_codec(REDIS_CODEC)
+        self.group = group
+        self.maxlen = maxlen
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self._claim_cursor = "0-0"
+
+    async def publish(self, order: Dict[str, Any]) -> str:
+        return await self.redis.xadd(
+            self.STREAM_KEY, {"order": dumps(order, self.codec)},
+            maxlen=self.maxlen, approximate=True
+        )
+
+    async def ensure_group(self) -> None:
+        # Вызывается и при NOGROUP: после FLUSHALL или переключения на реплику
+        # без группы поток и группа создаются заново
+        self._claim_cursor = "0-0"
+        try:
+            await self.redis.xgroup_create(self.STREAM_KEY, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, count: int = 10, block: float = ORDERS_STREAM_BLOCK) -> List[Entry]:
+        response = await self.redis.xreadgroup(
+            self.group, self.consumer, {self.STREAM_KEY: ">"},
+            count=count, block=int(block * 1000)
+        )
+        return [entry for _, entries in response or [] for entry in self._decode(entries)]
+
+    async def reclaim(self, count: int = 10, min_idle: float = ORDERS_STREAM_CLAIM_IDLE) -> List[Entry]:
+        # Забираем заказы, которые другой экземпляр прочитал, но не подтвердил
+        response = await self.redis.xautoclaim(
+            self.STREAM_KEY, self.group, self.consumer,
+            min_idle_time=int(min_idle * 1000), start_id=self._claim_cursor, count=count
+        )
+        self._claim_cursor = response[0]
+        return self._decode(response[1])
+
+    async def start_delivery(self, entry_id: str) -> Tuple[Set[str], int]:
+        """Чаты, которым заказ уже доставлен, и номер текущей попытки доставки."""
+        key = self.DELIVERY_KEY.format(entry_id=entry_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hincrby(key, "attempts", 1)
+        pipe.expire(key, self.DELIVERY_TTL)
+        pipe.hkeys(key)
+        attempt, _, fields = await pipe.execute()
+        return {field[len("chat:"):] for field in fields if field.startswith("chat:")}, attempt
+
+    async def mark_delivered(self, entry_id: str, chat_ids: List[str]) -> None:
+        if chat_ids:
+            key = self.DELIVERY_KEY.format(entry_id=entry_id)
+            await self.redis.hset(key, mapping={f"chat:{chat_id}": 1 for chat_id in chat_ids})
+
+    async def ack(self, entry_id: str) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(self.STREAM_KEY, self.group, entry_id)
+        pipe.delete(self.DELIVERY_KEY.format(entry_id=entry_id))
+        await pipe.execute()
+
+    def _decode(self, entries) -> List[Entry]:
+        decoded = []
+        for entry_id, fields in entries:
+            # Запись могла быть удалена при обрезке потока, пока висела в ожидании
+            if not fields:
+                continue
+            decoded.append((entry_id, loads(fields["order"])))
+        return decoded
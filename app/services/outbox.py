@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import (
+    OUTBOX_POLL_INTERVAL, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_DELAY, OUTBOX_RETRY_MAX_DELAY, OUTBOX_LEASE
+)
+from models.models import OrderOutbox
+from services.redis_service import RedisService
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class OutboxDispatcher:
+    """
+    Доставка побочных действий заказа из таблицы order_outbox.
+
+    Воркер забирает пачку записей короткой транзакцией (FOR UPDATE SKIP LOCKED):
+    next_attempt_at сдвигается на lease, и другие воркеры эти записи не видят,
+    пока срок не истечет. Доставка идет вне транзакции, результат записывается
+    отдельной. Неудачная доставка повторяется с экспоненциальной задержкой,
+    после max_attempts запись помечается failed; это единственный уровень
+    повторов, обработчики сами не повторяют.
+    Выполненные ключи дедупликации хранятся в Redis: если действие прошло,
+    а отметка в БД не сохранилась, повтор его не выполнит.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    DONE_KEY = "outbox_done:{dedup_key}"
+    DONE_TTL = 7 * 24 * 3600
+
+    def __init__(self, session_maker: async_sessionmaker, redis_service: RedisService,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 batch_size: int = OUTBOX_BATCH_SIZE,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 lease: float = OUTBOX_LEASE):
+        self.session_maker = session_maker
+        self.redis = redis_service
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.stats = {"delivered": 0, "retried": 0, "failed": 0, "deduplicated": 0}
+        self._handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, event: str, handler: Handler) -> None:
+        self._handlers[event] = handler
+
+    @staticmethod
+    def add(session: AsyncSession, order_id: int, event: str, payload: Dict[str, Any]) -> None:
+        # Запись добавляется в сессию заказа и фиксируется тем же commit
+        session.add(OrderOutbox(
+            order_id=order_id,
+            event=event,
+            dedup_key=f"{order_id}:{event}",
+            payload=payload,
+            status=OutboxDispatcher.PENDING,
+            attempts=0,
+        ))
+
+    def notify(self) -> None:
+        # Будит диспетчер сразу после commit, не дожидаясь poll_interval
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.dispatch_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        entries = await self._claim()
+        if not entries:
+            return 0
+        await asyncio.gather(*(self._deliver(entry) for entry in entries))
+        async with self.session_maker() as session:
+            for entry in entries:
+                await session.execute(
+                    update(OrderOutbox)
+                    .where(OrderOutbox.id == entry.id)
+                    .values(
+                        status=entry.status,
+                        attempts=entry.attempts,
+                        last_error=entry.last_error,
+                        next_attempt_at=entry.next_attempt_at,
+                        processed_at=entry.processed_at,
+                    )
+                )
+            await session.commit()
+        return len(entries)
+
+    async def _claim(self) -> List[OrderOutbox]:
+        # Строки заблокированы только на время этого UPDATE, а не на время доставки
+        now = datetime.now(timezone.utc)
+        due = (
+            select(OrderOutbox.id)
+            .where(OrderOutbox.status == self.PENDING, OrderOutbox.next_attempt_at <= now)
+            .order_by(OrderOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.session_maker() as session:
+            query = (
+                update(OrderOutbox)
+                .where(OrderOutbox.id.in_(due.scalar_subquery()))
+                .values(next_attempt_at=now + timedelta(seconds=self.lease))
+                .returning(OrderOutbox)
+                .execution_options(synchronize_session=False)
+            )
+            entries = (await session.execute(query)).scalars().all()
+            await session.commit()
+        return sorted(entries, key=lambda entry: entry.id)
+
+    async def _deliver(self, entry: OrderOutbox) -> None:
+        done_key = self.DONE_KEY.format(dedup_key=entry.dedup_key)
+        now = datetime.now(timezone.utc)
+        if await self.redis.get_json(done_key):
+            entry.status = self.DONE
+            entry.processed_at = now
+            self.stats["deduplicated"] += 1
+            return
+
+        handler = self._handlers.get(entry.event)
+        try:
+            if handler is None:
+                raise LookupError(f"No outbox handler for {entry.event}")
+            await handler(entry.payload)
+        except Exception as e:
+            entry.attempts += 1
+            entry.last_error = str(e)[:500]
+            if entry.attempts >= self.max_attempts:
+                entry.status = self.FAILED
+                self.stats["failed"] += 1
+                logger.error(f"Outbox {entry.dedup_key} failed after {entry.attempts} attempts: {e}")
+            else:
+                entry.next_attempt_at = now + timedelta(seconds=self._retry_delay(entry.attempts))
+                self.stats["retried"] += 1
+                logger.warning(f"Outbox {entry.dedup_key} attempt {entry.attempts} failed: {e}")
+            return
+
+        await self.redis.set_json(done_key, 1, ttl=self.DONE_TTL)
+        entry.status = self.DONE
+        entry.attempts += 1
+        entry.processed_at = now
+        self.stats["delivered"] += 1
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> float:
+        delay = min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
@@ -0,0 +1,118 @@
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import PubSub
+
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_POOL_SIZE, REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT, REDIS_HEALTH_CHECK_INTERVAL, REDIS_PUBSUB_POLL_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MeteredConnectionPool(BlockingConnectionPool):
+    """
+    Пул соединений Redis, считающий выдачи соединений и ожидание свободного.
+
+    Когда все соединения заняты, запрос ждет освобождения не дольше
+    timeout, а не открывает новое соединение сверх лимита.
+    """
+
+    # Выдача дольше этого порога считается ожиданием свободного соединения
+    WAIT_THRESHOLD = 0.001
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.peak_in_use = 0
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except Exception:
+            self.timeouts += 1
+            raise
+        elapsed = time.monotonic() - start
+        self.acquired += 1
+        if elapsed > self.WAIT_THRESHOLD:
+            self.waited += 1
+            self.wait_time += elapsed
+        self.peak_in_use = max(self.peak_in_use, len(self._in_use_connections))
+        return connection
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "peak_in_use": self.peak_in_use,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_time": round(self.wait_time, 3),
+            "timeouts": self.timeouts,
+        }
+
+
+_pool: Optional[MeteredConnectionPool] = None
+_client: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    """
+    Асинхронный клиент Redis, общий для процесса.
+
+    Все сервисы (корзина, заказы, кэш СБИС, бот) берут соединения из одного
+    пула, поэтому их запросы выполняются параллельно и не блокируют цикл событий.
+    """
+    global _pool, _client
+    if _client is None:
+        _pool = MeteredConnectionPool(
+            host=REDIS_HOST or "127.0.0.1",
+            port=REDIS_PORT,
+            max_connections=REDIS_POOL_SIZE,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            decode_responses=True,
+            # Двоичные значения (msgpack) проходят через строки без потерь
+            encoding_errors="surrogateescape",
+        )
+        _client = Redis(connection_pool=_pool)
+    return _client
+
+
+async def iter_messages(pubsub: PubSub, poll_interval: float = REDIS_PUBSUB_POLL_INTERVAL) -> AsyncIterator[Dict]:
+    """
+    Сообщения подписки одно за другим.
+
+    PubSub.listen ждет следующее сообщение одним чтением, и на соединении
+    общего пула оно обрывается по socket_timeout, если канал простаивает.
+    Здесь каждое чтение ждет не дольше poll_interval, пустой ответ означает
+    простой, а между чтениями подписка сама проверяет соединение (health check).
+    """
+    while True:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
+        if message is not None:
+            yield message
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    return _pool.get_stats() if _pool else {}
+
+
+async def close_redis() -> None:
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+        await _pool.disconnect()
+        _pool = None
+        _client = None
+        logger.info("Redis connection pool closed")
@@ -1,90 +1,428 @@
-import json
-from typing import Dict, List, Optional
+import hashlib
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Union
 import redis
+from redis.asyncio import Redis
 import logging
-from dto.dto import CartRedis
-from config import REDIS_HOST, REDIS_PORT
+from dto.dto import CartRedis, MenuSyncResult
+from services.redis_pool import get_redis, iter_messages
+from utils.serialization import Codec, dumps, get_codec, loads
+from config import CART_TTL, REDIS_CODEC
 logger = logging.getLogger(__name__)
 
+# Снять или продлить блокировку может только ее владелец
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Корзина хранится хэшем product_id -> quantity. Каждая операция - один
+# атомарный вызов скрипта: изменение, продление срока жизни и возврат
+# содержимого корзины. Корзины прежнего формата (JSON-строка) переводятся
+# в хэш при первом обращении
+CART_PRELUDE = """
+local key = KEYS[1]
+local ttl = tonumber(ARGV[1])
+if redis.call('type', key).ok == 'string' then
+    local cart = cjson.decode(redis.call('get', key))
+    redis.call('del', key)
+    for _, item in ipairs(cart['items'] or {}) do
+        local quantity = tonumber(item['quantity']) or 0
+        if quantity > 0 then
+            redis.call('hincrby', key, tostring(item['product_id']), quantity)
+        end
+    end
+end
+"""
+CART_RETURN = """
+if ttl > 0 and redis.call('exists', key) == 1 then
+    redis.call('expire', key, ttl)
+end
+return redis.call('hgetall', key)
+"""
+CART_ADD_SCRIPT = """
+if redis.call('hincrby', key, ARGV[2], ARGV[3]) <= 0 then
+    redis.call('hdel', key, ARGV[2])
+end
+""" + CART_RETURN
+CART_SET_SCRIPT = """
+if redis.call('hexists', key, ARGV[2]) == 1 then
+    if tonumber(ARGV[3]) > 0 then
+        redis.call('hset', key, ARGV[2], ARGV[3])
+    else
+        redis.call('hdel', key, ARGV[2])
+    end
+end
+""" + CART_RETURN
+CART_DELETE_SCRIPT = """
+redis.call('hdel', key, ARGV[2])
+""" + CART_RETURN
+CART_GET_SCRIPT = CART_RETURN
+
+# Кэш сохраняется, только если версия не изменилась с начала его построения:
+# иначе запись, пришедшая во время построения, была бы перекрыта старыми данными
+SET_IF_VERSION_SCRIPT = """
+if (redis.call('get', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+async def _iterate(items: Union[Iterable, AsyncIterable]):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
 class RedisService:
-    def __init__(self, redis_url: str = f"redis://{REDIS_HOST}:{REDIS_PORT}"):
-        self.redis = redis.from_url(redis_url, decode_responses=True)
+    PRODUCTS_KEY = "sbis_products"
+    PRODUCTS_DIGEST_KEY = "sbis_products_digest"
+    PRODUCTS_VERSION_KEY = "sbis_products_version"
+    PRODUCTS_SYNC_STATS_KEY = "sbis_products_sync"
+    PRODUCTS_VERSION_CHANNEL = "sbis_products_version"
+    PRODUCTS_SYNC_CHANNEL = "sbis_products_sync_requests"
+    IMAGE_VARIANTS_KEY = "product_images"
+    CART_KEY = "cart:{user_id}"
+    GROUPED_MENU_KEY = "grouped_menu"
+    GROUPED_MENU_VERSION_KEY = "grouped_menu_version"
+
+    def __init__(self, client: Optional[Redis] = None, cart_ttl: int = CART_TTL,
+                 codec: Optional[Codec] = None):
+        self.redis = client or get_redis()
+        self.codec = codec or get_codec(REDIS_CODEC)
+        self.cart_ttl = cart_ttl
+        self._cart_add = self.redis.register_script(CART_PRELUDE + CART_ADD_SCRIPT)
+        self._cart_set = self.redis.register_script(CART_PRELUDE + CART_SET_SCRIPT)
+        self._cart_delete = self.redis.register_script(CART_PRELUDE + CART_DELETE_SCRIPT)
+        self._cart_get = self.redis.register_script(CART_PRELUDE + CART_GET_SCRIPT)
+        self._set_if_version = self.redis.register_script(SET_IF_VERSION_SCRIPT)
 
-    async def set_products(self, products: List[Dict]) -> None:
+    async def set_products(self, products: Union[Iterable[Dict], AsyncIterable[Dict]]) -> Optional[MenuSyncResult]:
+        # Дельта-синхронизация: пишем только добавленные, измененные и удаленные
+        # позиции одной транзакцией, чтобы читатели не видели пустое меню.
+        # Товары можно передавать асинхронным генератором: в памяти остаются
+        # только id и измененные позиции
         try:
-            self.redis.delete("sbis_products")
-            for product in products:
-                self.redis.hset("sbis_products", product["id"], json.dumps(product))
-        except Exception as e:
+            snapshot = self.redis.pipeline(transaction=False)
+            snapshot.hgetall(self.PRODUCTS_DIGEST_KEY)
+            snapshot.hkeys(self.PRODUCTS_KEY)
+            previous, stored_ids = await snapshot.execute()
+
+            payloads = {}
+            digests = {}
+            current_ids = set()
+            async for product in _iterate(products):
+                product_id = str(product["id"])
+                current_ids.add(product_id)
+                payload = dumps(product, self.codec)
+                digest = hashlib.sha1(payload).hexdigest()
+                if previous.get(product_id) != digest:
+                    payloads[product_id] = payload
+                    digests[product_id] = digest
+
+            if not current_ids:
+                logger.warning("Empty product list received, menu sync skipped")
+                return None
+
+            removed = (set(previous) | set(stored_ids)) - current_ids
+            added = sum(1 for product_id in payloads if product_id not in previous)
+            result = MenuSyncResult(
+                added=added,
+                changed=len(payloads) - added,
+                removed=len(removed),
+                unchanged=len(current_ids) - len(payloads),
+            )
+
+            pipe = self.redis.pipeline(transaction=True)
+            if payloads:
+                pipe.hset(self.PRODUCTS_KEY, mapping=payloads)
+                pipe.hset(self.PRODUCTS_DIGEST_KEY, mapping=digests)
+            if removed:
+                pipe.hdel(self.PRODUCTS_KEY, *removed)
+                pipe.hdel(self.PRODUCTS_DIGEST_KEY, *removed)
+            if payloads or removed:
+                pipe.incr(self.PRODUCTS_VERSION_KEY)
+            else:
+                pipe.get(self.PRODUCTS_VERSION_KEY)
+            pipe.hset(self.PRODUCTS_SYNC_STATS_KEY, mapping={
+                **{key: value for key, value in result.model_dump().items() if key != "version"},
+                "synced_at": datetime.now().isoformat(),
+            })
+            replies = await pipe.execute()
+            result.version = int(replies[-2] or 0)
+            return result
+        except redis.RedisError as e:
             logger.error(f"Error storing products in Redis: {e}")
-            
+            return None
 
     async def get_products(self) -> List[Dict]:
         try:
-            products = self.redis.hgetall("sbis_products")
-            return [json.loads(p) for p in products.values()]
+            products = await self.redis.hgetall(self.PRODUCTS_KEY)
+            return [loads(p) for p in products.values()]
         except Exception as e:
             logger.error(f"Error getting products from Redis: {e}")
             return []
 
     async def get_product(self, product_id: int) -> Optional[Dict]:
         try:
-            product = self.redis.hget("sbis_products", str(product_id))
-            return json.loads(product) if product else None
+            product = await self.redis.hget(self.PRODUCTS_KEY, str(product_id))
+            return loads(product) if product else None
         except Exception as e:
             logger.error(f"Error getting product from Redis: {e}")
             return None
 
-    async def add_to_cart(self, items: CartRedis):
+    async def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Dict]:
         try:
-            cart_key = f"cart:{items.user_id}"
-            cart = json.loads(self.redis.get(cart_key) or '{"items": []}')
-            for item in cart ["items"]:
-                if item["product_id"] == items.product_id:
-                    item["quantity"] += items.quantity
-                    break
-            else:
-                cart["items"].append({"product_id": items.product_id, "quantity": items.quantity})
+            product_ids = list(product_ids)
+            if not product_ids:
+                return {}
+            products = await self.redis.hmget(self.PRODUCTS_KEY, [str(i) for i in product_ids])
+            return {
+                product_id: loads(product)
+                for product_id, product in zip(product_ids, products) if product
+            }
+        except Exception as e:
+            logger.error(f"Error getting products from Redis: {e}")
+            return {}
+
+    async def get_products_version(self) -> int:
+        try:
+            return int(await self.redis.get(self.PRODUCTS_VERSION_KEY) or 0)
+        except Exception as e:
+            logger.error(f"Error getting products version from Redis: {e}")
+            return 0
+
+    async def bump_products_version(self) -> Optional[int]:
+        try:
+            return int(await self.redis.incr(self.PRODUCTS_VERSION_KEY))
+        except Exception as e:
+            logger.error(f"Error bumping products version in Redis: {e}")
+            return None
+
+    async def publish_products_version(self, version: int) -> None:
+        try:
+            await self.redis.publish(self.PRODUCTS_VERSION_CHANNEL, str(version))
+        except Exception as e:
+            logger.error(f"Error publishing products version: {e}")
+
+    async def listen_products_version(self) -> AsyncIterator[int]:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.PRODUCTS_VERSION_CHANNEL)
+            async for message in iter_messages(pubsub):
+                yield int(message["data"])
+        finally:
+            await pubsub.aclose()
+
+    async def request_products_sync(self) -> None:
+        try:
+            await self.redis.publish(self.PRODUCTS_SYNC_CHANNEL, "1")
+        except Exception as e:
+            logger.error(f"Error requesting products sync: {e}")
+
+    async def listen_products_sync_requests(self) -> AsyncIterator[None]:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.PRODUCTS_SYNC_CHANNEL)
+            async for _ in iter_messages(pubsub):
+                yield None
+        finally:
+            await pubsub.aclose()
+
+    async def get_products_sync_stats(self) -> Dict:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(self.PRODUCTS_SYNC_STATS_KEY)
+            pipe.get(self.PRODUCTS_VERSION_KEY)
+            stats, version = await pipe.execute()
+            return {**stats, "version": int(version or 0)}
+        except Exception as e:
+            logger.error(f"Error getting sync stats from Redis: {e}")
+            return {}
+
+    async def get_image_variants(self) -> Dict[str, Dict[str, str]]:
+        try:
+            variants = await self.redis.hgetall(self.IMAGE_VARIANTS_KEY)
+            return {source: loads(paths) for source, paths in variants.items()}
+        except Exception as e:
+            logger.error(f"Error getting image variants from Redis: {e}")
+            return {}
+
+    async def set_image_variants(self, source: str, variants: Dict[str, str]) -> None:
+        try:
+            await self.redis.hset(self.IMAGE_VARIANTS_KEY, source, dumps(variants, self.codec))
+        except Exception as e:
+            logger.error(f"Error storing image variants in Redis: {e}")
+
+    async def get_grouped_menu(self) -> Optional[str]:
+        # Меню хранится готовым JSON-ответом, без кодека
+        try:
+            return await self.redis.get(self.GROUPED_MENU_KEY)
+        except Exception as e:
+            logger.error(f"Error getting grouped menu from Redis: {e}")
+            return None
+
+    async def get_grouped_menu_version(self) -> Optional[str]:
+        try:
+            return await self.redis.get(self.GROUPED_MENU_VERSION_KEY) or "0"
+        except Exception as e:
+            logger.error(f"Error getting grouped menu version from Redis: {e}")
+            return None
+
+    async def set_grouped_menu(self, body: str, version: str, ttl: int) -> bool:
+        try:
+            return bool(await self._set_if_version(
+                keys=[self.GROUPED_MENU_KEY, self.GROUPED_MENU_VERSION_KEY],
+                args=[version, body, ttl],
+            ))
+        except Exception as e:
+            logger.error(f"Error storing grouped menu in Redis: {e}")
+            return False
+
+    async def invalidate_grouped_menu(self) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.incr(self.GROUPED_MENU_VERSION_KEY)
+            pipe.delete(self.GROUPED_MENU_KEY)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error invalidating grouped menu in Redis: {e}")
+
+    async def get_counter(self, key: str) -> Optional[int]:
+        try:
+            return int(await self.redis.get(key) or 0)
+        except Exception as e:
+            logger.error(f"Error getting counter {key} from Redis: {e}")
+            return None
+
+    async def bump_counter(self, key: str) -> Optional[int]:
+        try:
+            return int(await self.redis.incr(key))
+        except Exception as e:
+            logger.error(f"Error bumping counter {key} in Redis: {e}")
+            return None
 
-            self.redis.set(cart_key, json.dumps(cart))
-            return cart
+    async def get_json(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.redis.get(key)
+            return loads(value) if value else None
+        except Exception as e:
+            logger.error(f"Error getting {key} from Redis: {e}")
+            return None
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        try:
+            await self.redis.set(key, dumps(value, self.codec), ex=ttl)
+        except Exception as e:
+            logger.error(f"Error storing {key} in Redis: {e}")
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            if keys:
+                await self.redis.delete(*keys)
+        except Exception as e:
+            logger.error(f"Error deleting {keys} from Redis: {e}")
+
+    async def get_hash(self, key: str) -> Dict[str, str]:
+        try:
+            return await self.redis.hgetall(key)
+        except Exception as e:
+            logger.error(f"Error getting {key} from Redis: {e}")
+            return {}
+
+    async def set_hash(self, key: str, mapping: Dict[str, Any]) -> None:
+        try:
+            await self.redis.hset(key, mapping={k: str(v) for k, v in mapping.items()})
+        except Exception as e:
+            logger.error(f"Error storing {key} in Redis: {e}")
+
+    async def acquire_lock(self, key: str, owner: str, ttl: float) -> bool:
+        try:
+            return bool(await self.redis.set(key, owner, nx=True, px=int(ttl * 1000)))
+        except Exception as e:
+            logger.error(f"Error acquiring lock {key}: {e}")
+            return False
+
+    async def extend_lock(self, key: str, owner: str, ttl: float) -> bool:
+        try:
+            return bool(await self.redis.eval(EXTEND_LOCK_SCRIPT, 1, key, owner, int(ttl * 1000)))
+        except Exception as e:
+            logger.error(f"Error extending lock {key}: {e}")
+            return False
+
+    async def release_lock(self, key: str, owner: str) -> None:
+        try:
+            await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, key, owner)
+        except Exception as e:
+            logger.error(f"Error releasing lock {key}: {e}")
+
+    def _cart_key(self, user_id: Union[int, str]) -> str:
+        return self.CART_KEY.format(user_id=user_id)
+
+    async def _run_cart_script(self, script, user_id: Union[int, str], *args) -> Dict[str, List[Dict[str, int]]]:
+        flat = await script(keys=[self._cart_key(user_id)], args=[self.cart_ttl, *args])
+        return {
+            "items": [
+                {"product_id": int(flat[i]), "quantity": int(flat[i + 1])}
+                for i in range(0, len(flat), 2)
+            ]
+        }
+
+    async def add_to_cart(self, items: CartRedis):
+        try:
+            return await self._run_cart_script(
+                self._cart_add, items.user_id, items.product_id, items.quantity
+            )
         except Exception as e:
             logger.error(f"Error adding to cart: {e}")
 
     async def get_cart(self, user_id: int):
         try:
-            cart = self.redis.get(f"cart:{user_id}")
-            return json.loads(cart) if cart else {"items": []}
+            return await self._run_cart_script(self._cart_get, user_id)
         except Exception as e:
             logger.error(f"Ошибка обработки данных: {e}")
             return {"items": []}
-    
+
     async def update_from_cart(self, items: CartRedis):
         try:
-            cart_key = f"cart:{items.user_id}"
-            cart = json.loads(self.redis.get(cart_key) or '{"items": []}')
-            
-            for item in cart["items"]:
-                if item["product_id"] == items.product_id:
-                    if items.quantity > 0:
-                        item["quantity"] = items.quantity
-                    else:
-                        cart["items"].remove(item)
-                    break
-
-            self.redis.set(cart_key, json.dumps(cart))
-            return cart
+            return await self._run_cart_script(
+                self._cart_set, items.user_id, items.product_id, items.quantity
+            )
         except Exception as e:
             logger.error(f"Ошибка обработки данных: {e}")
             return {"items": []}
-    
+
     async def delete_from_cart(self, product_id: int, user_id: str):
         try:
-            cart_key = f"cart:{user_id}"
-            cart = json.loads(self.redis.get(cart_key) or '{"items": []}')
-            cart["items"] = [item for item in cart["items"] if item["product_id"] != product_id]
-            self.redis.set(cart_key, json.dumps(cart))
-            return cart
+            return await self._run_cart_script(self._cart_delete, user_id, product_id)
         except Exception as e:
             logger.error(f"Ошибка обработки данных: {e}")
-            return {"items": []}
\ No newline at end of file
+            return {"items": []}
+
+    async def migrate_carts(self) -> int:
+        # Переводит все корзины, сохраненные прежним JSON-форматом, в хэши
+        # и назначает им срок жизни; уже переведенные корзины не меняются
+        migrated = 0
+        try:
+            async for key in self.redis.scan_iter(match=self.CART_KEY.format(user_id="*"), count=500):
+                if await self.redis.type(key) == "string":
+                    await self._cart_get(keys=[key], args=[self.cart_ttl])
+                    migrated += 1
+        except Exception as e:
+            logger.error(f"Error migrating carts: {e}")
+        if migrated:
+            logger.info(f"Migrated {migrated} carts to hashes")
+        return migrated
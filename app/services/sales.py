@@ -0,0 +1,198 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SALES_TIMEZONE
+from models.models import Order, ProductSalesDaily, SalesDaily, SalesHourly
+
+logger = logging.getLogger(__name__)
+
+ProductLine = Tuple[str, str, int, Decimal]
+
+
+def _number(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value)) if value is not None else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def order_lines(items: Optional[Iterable[Dict[str, Any]]]) -> List[ProductLine]:
+    """Позиции заказа как (ключ блюда, название, количество, сумма)."""
+    lines = []
+    for item in items or []:
+        name = item.get("foodName")
+        key = str(item.get("id") or name or "")
+        if not key:
+            continue
+        quantity = int(_number(item.get("count")))
+        lines.append((key, name, quantity, _number(item.get("price")) * quantity))
+    return lines
+
+
+class SalesRollup:
+    """
+    Сводки продаж по часам, дням и блюдам.
+
+    Каждый заказ прибавляет свои суммы к строкам сводок в той же транзакции,
+    в которой создается (INSERT ... ON CONFLICT DO UPDATE), поэтому отчеты
+    читают несколько строк сводок и не обращаются к таблице заказов.
+    backfill пересчитывает сводки из истории заказов одним SQL-запросом
+    на таблицу.
+    """
+
+    def __init__(self, timezone: str = SALES_TIMEZONE):
+        self.timezone = timezone
+        self.zone = ZoneInfo(timezone)
+
+    def local_hour(self, moment: datetime) -> datetime:
+        return moment.astimezone(self.zone).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+    async def apply(self, session: AsyncSession, created_at: datetime, total: Any,
+                    items: Optional[Iterable[Dict[str, Any]]]) -> None:
+        hour = self.local_hour(created_at)
+        lines = order_lines(items)
+        revenue = _number(total)
+        quantity = sum(line[2] for line in lines)
+
+        # Строки блокируются всегда в одном порядке (час, день, блюда по ключу),
+        # чтобы параллельные заказы не взаимоблокировались
+        for table, key in ((SalesHourly, {"bucket": hour}), (SalesDaily, {"day": hour.date()})):
+            statement = insert(table).values(**key, orders=1, revenue=revenue, items=quantity)
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=list(key),
+                set_={
+                    "orders": table.orders + 1,
+                    "revenue": table.revenue + statement.excluded.revenue,
+                    "items": table.items + statement.excluded.items,
+                },
+            ))
+
+        products: Dict[str, List] = defaultdict(lambda: [None, 0, Decimal(0)])
+        for key, name, count, amount in lines:
+            product = products[key]
+            product[0] = product[0] or name
+            product[1] += count
+            product[2] += amount
+        if not products:
+            return
+        statement = insert(ProductSalesDaily).values([
+            {"day": hour.date(), "product_key": key, "product_name": name,
+             "quantity": count, "revenue": amount}
+            for key, (name, count, amount) in sorted(products.items())
+        ])
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=["day", "product_key"],
+            set_={
+                "product_name": func.coalesce(statement.excluded.product_name, ProductSalesDaily.product_name),
+                "quantity": ProductSalesDaily.quantity + statement.excluded.quantity,
+                "revenue": ProductSalesDaily.revenue + statement.excluded.revenue,
+            },
+        ))
+
+    async def backfill(self, session: AsyncSession, since: Optional[date] = None) -> Dict[str, int]:
+        """
+        Пересчитывает сводки начиная с since (или целиком) из таблицы заказов.
+
+        Таблицы сводок блокируются на время пересчета: заказы, созданные
+        в это время, дождутся окончания и прибавятся к новым значениям.
+        Заказы без createdAt (созданные до появления колонки) пропускаются:
+        время их создания неизвестно, и сводки по ним были бы неверными.
+        Их число возвращается в skipped.
+        """
+        await session.execute(text(
+            "LOCK TABLE sales_hourly, sales_daily, product_sales_daily IN EXCLUSIVE MODE"
+        ))
+        since_hour = datetime.combine(since, datetime.min.time()) if since else datetime.min
+        since_day = since or date.min
+        await session.execute(delete(SalesHourly).where(SalesHourly.bucket >= since_hour))
+        await session.execute(delete(SalesDaily).where(SalesDaily.day >= since_day))
+        await session.execute(delete(ProductSalesDaily).where(ProductSalesDaily.day >= since_day))
+
+        params = {"tz": self.timezone, "since": since_hour}
+        hourly = await session.execute(text("""
+            INSERT INTO sales_hourly (bucket, orders, revenue, items)
+            SELECT date_trunc('hour', o."createdAt" AT TIME ZONE :tz),
+                   count(*), coalesce(sum(o.total), 0), coalesce(sum(q.quantity), 0)
+            FROM "order" o
+            LEFT JOIN LATERAL (
+                SELECT sum((item->>'count')::numeric)::int AS quantity FROM unnest(o.items) AS item
+            ) q ON true
+            WHERE o."createdAt" IS NOT NULL AND o."createdAt" AT TIME ZONE :tz >= :since
+            GROUP BY 1
+        """), params)
+        daily = await session.execute(text("""
+            INSERT INTO sales_daily (day, orders, revenue, items)
+            SELECT bucket::date, sum(orders), sum(revenue), sum(items)
+            FROM sales_hourly WHERE bucket >= :since
+            GROUP BY 1
+        """), params)
+        products = await session.execute(text("""
+            INSERT INTO product_sales_daily (day, product_key, product_name, quantity, revenue)
+            SELECT (o."createdAt" AT TIME ZONE :tz)::date,
+                   coalesce(item->>'id', item->>'foodName'), max(item->>'foodName'),
+                   sum((item->>'count')::numeric)::int,
+                   sum((item->>'price')::numeric * (item->>'count')::numeric)
+            FROM "order" o, unnest(o.items) AS item
+            WHERE o."createdAt" IS NOT NULL AND o."createdAt" AT TIME ZONE :tz >= :since
+              AND coalesce(item->>'id', item->>'foodName') IS NOT NULL
+            GROUP BY 1, 2
+        """), params)
+        skipped = await session.scalar(select(func.count()).select_from(Order).where(Order.createdAt.is_(None)))
+        return {"hours": hourly.rowcount, "days": daily.rowcount, "products": products.rowcount,
+                "skipped": skipped}
+
+    async def summary(self, session: AsyncSession, date_from: date, date_to: date) -> Dict[str, Any]:
+        rows = (await session.execute(
+            select(SalesDaily)
+            .where(SalesDaily.day >= date_from, SalesDaily.day <= date_to)
+            .order_by(SalesDaily.day)
+        )).scalars().all()
+        days = [
+            {"day": row.day, "orders": row.orders, "revenue": row.revenue, "items": row.items}
+            for row in rows
+        ]
+        orders = sum(day["orders"] for day in days)
+        revenue = sum((day["revenue"] for day in days), Decimal(0))
+        return {
+            "orders": orders,
+            "revenue": revenue,
+            "items": sum(day["items"] for day in days),
+            "average_check": (revenue / orders).quantize(Decimal("0.01")) if orders else Decimal(0),
+            "days": days,
+        }
+
+    async def hourly(self, session: AsyncSession, day: date) -> List[Dict[str, Any]]:
+        start = datetime.combine(day, datetime.min.time())
+        rows = (await session.execute(
+            select(SalesHourly)
+            .where(SalesHourly.bucket >= start, SalesHourly.bucket < start + timedelta(days=1))
+            .order_by(SalesHourly.bucket)
+        )).scalars().all()
+        return [
+            {"hour": row.bucket.hour, "orders": row.orders, "revenue": row.revenue, "items": row.items}
+            for row in rows
+        ]
+
+    async def top_products(self, session: AsyncSession, date_from: date, date_to: date,
+                           limit: int = 10, by: str = "quantity") -> List[Dict[str, Any]]:
+        quantity = func.sum(ProductSalesDaily.quantity).label("quantity")
+        revenue = func.sum(ProductSalesDaily.revenue).label("revenue")
+        rows = (await session.execute(
+            select(ProductSalesDaily.product_key, func.max(ProductSalesDaily.product_name), quantity, revenue)
+            .where(ProductSalesDaily.day >= date_from, ProductSalesDaily.day <= date_to)
+            .group_by(ProductSalesDaily.product_key)
+            .order_by((revenue if by == "revenue" else quantity).desc())
+            .limit(limit)
+        )).all()
+        return [
+            {"product_key": key, "product_name": name, "quantity": count, "revenue": amount}
+            for key, name, count, amount in rows
+        ]
@@ -3,117 +3,265 @@ import json
 import base64
 import logging
 import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from aiohttp import ClientSession, ClientTimeout
-import requests
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Iterable
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from PIL import Image
 from services.redis_service import RedisService
-from dto.dto import AuthorizationData, FoodsRequest, TokenValidation
-from exceptions.sbis import SBISAuthError, SBISRequestError
+from services.sbis_metadata import SBISMetadataCache
+from services.image_mirror import ImageMirror
+from services.catalog_index import CatalogIndex, CatalogIndexBuilder
+from services.category_tree import CategoryTree
+from services.menu_payload import MenuPayload
+from dto.dto import AuthorizationData, FoodsRequest, MenuSyncResult, TokenValidation
+from exceptions.sbis import SBISException, SBISAuthError, SBISRequestError, SBISUnavailableError
+from utils.circuit_breaker import CircuitBreaker
+from config import (
+    SBIS_POOL_SIZE, SBIS_POOL_PER_HOST, SBIS_KEEPALIVE_TIMEOUT,
+    SBIS_CONNECT_TIMEOUT, SBIS_REQUEST_TIMEOUT, SBIS_NOMENCLATURE_TIMEOUT,
+    SBIS_RETRIES, SBIS_PAGE_SIZE, SBIS_BREAKER_FAILURES, SBIS_BREAKER_COOLDOWN,
+    SBIS_TOKEN_TTL, SBIS_SALES_POINT, SBIS_MENU_PRICE_LIST, SBIS_CATEGORY_PRICE_LIST,
+    IMAGE_MIRROR_ENABLED, CATALOG_ROOT_CATEGORIES, CATALOG_EXCLUDED_CATEGORIES,
+    CATALOG_CACHE_MAX_STALENESS, CATALOG_SYNC_MIN_INTERVAL, CATALOG_COLD_WAIT
+)
 
 logger = logging.getLogger(__name__)
 
 
 class SBISService:
 
+    AUTH_URL = 'https://online.sbis.ru/oauth/service/'
+    API_URL = 'https://api.sbis.ru/retail'
+
     def __init__(self):
-        self.timeout = ClientTimeout(total=30)
-        self.session = ClientSession(timeout=self.timeout)
+        self.timeout = ClientTimeout(
+            total=SBIS_REQUEST_TIMEOUT,
+            sock_connect=SBIS_CONNECT_TIMEOUT
+        )
+        self.session: Optional[ClientSession] = None
         self._token_cache = {}
+        self._auth_data: Optional[AuthorizationData] = None
+        # Общий для воркеров менеджер токена (services.sbis_token), если задан
+        self.tokens = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.request_stats = {'upstream': 0, 'deduplicated': 0}
+        self.breaker = CircuitBreaker(SBIS_BREAKER_FAILURES, SBIS_BREAKER_COOLDOWN)
 
     async def __aenter__(self):
-        if not self.session or self.session.closed:
-            self.session = ClientSession(timeout=self.timeout)
+        self._get_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session and not self.session.closed:
-            await self.session.close()
+        await self.close()
 
     async def close(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
+    def _get_session(self) -> ClientSession:
+        # Сессия создается лениво внутри event loop и переиспользует
+        # соединения пула для всех запросов к СБИС
+        if not self.session or self.session.closed:
+            connector = TCPConnector(
+                limit=SBIS_POOL_SIZE,
+                limit_per_host=SBIS_POOL_PER_HOST,
+                keepalive_timeout=SBIS_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            self.session = ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
     async def get_token(self, data: AuthorizationData) -> TokenValidation:
+        self._auth_data = data
+        if self.tokens:
+            return await self.tokens.get_token(data)
+
         cached_token = self._token_cache.get(data.app_client_id)
         if cached_token and cached_token['expires_at'] > datetime.now():
             return cached_token['token']
 
+        token = await self.fetch_token(data)
+        self._token_cache[data.app_client_id] = {
+            'token': token,
+            'expires_at': datetime.now() + timedelta(seconds=SBIS_TOKEN_TTL)
+        }
+        return token
+
+    async def fetch_token(self, data: AuthorizationData) -> TokenValidation:
+        if self.breaker.is_open:
+            raise SBISUnavailableError()
+
         try:
-            async with self.session.post(
-                'https://online.sbis.ru/oauth/service/',
+            async with self._get_session().post(
+                self.AUTH_URL,
                 json=AuthorizationData(app_client_id=data.app_client_id,
                                        app_secret=data.app_secret,
                                        secret_key=data.secret_key).model_dump()
             ) as response:
                 if response.status != 200:
-                    print(response.content)
+                    logger.error(f"SBIS auth failed with status {response.status}")
                     raise SBISAuthError()
 
                 token_data = await response.json()
-                token = TokenValidation(**token_data)
-                self._token_cache[data.app_client_id] = {
-                    'token': token,
-                    'expires_at': datetime.now() + timedelta(hours=1)
-                }
-                return token
+                return TokenValidation(**token_data)
+        except SBISAuthError:
+            raise
         except Exception as e:
             logger.error(f"Failed to fetch token: {str(e)}")
+            self.breaker.record_failure()
             raise SBISAuthError()
 
-    async def _make_request(self, method: str, url: str, **kwargs) -> Dict:
-        retries = 3
+    async def _refresh_auth_header(self, kwargs: Dict) -> None:
+        if not self._auth_data:
+            return
+        stale_token = kwargs.get('headers', {}).get("X-SBISAccessToken")
+        if self.tokens:
+            await self.tokens.invalidate(self._auth_data, stale_token)
+        else:
+            self._token_cache.clear()
+        token = await self.get_token(self._auth_data)
+        kwargs['headers'] = {
+            **kwargs.get('headers', {}),
+            "X-SBISAccessToken": token.access_token
+        }
+
+    async def _make_request(self, method: str, url: str, raw: bool = False,
+                            timeout: Optional[float] = None, **kwargs) -> Any:
+        # Одинаковые GET-запросы, выполняющиеся одновременно, разделяют
+        # один запрос к СБИС и его результат. Результат общий для всех
+        # ожидающих, поэтому изменять его на месте нельзя.
+        if method.upper() != 'GET':
+            return await self._send_request(method, url, raw, timeout, **kwargs)
+
+        key = self._request_key(method, url, raw, kwargs.get('params'))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.request_stats['deduplicated'] += 1
+            return await asyncio.shield(task)
+
+        self.request_stats['upstream'] += 1
+        task = asyncio.ensure_future(self._send_request(method, url, raw, timeout, **kwargs))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._release_inflight(key, t))
+        return await asyncio.shield(task)
+
+    def _release_inflight(self, key: tuple, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _request_key(method: str, url: str, raw: bool, params: Optional[Dict]) -> tuple:
+        items = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        return method.upper(), url, raw, items
+
+    def get_request_stats(self) -> Dict[str, int]:
+        return {**self.request_stats, 'inflight': len(self._inflight)}
+
+    async def _send_request(self, method: str, url: str, raw: bool = False,
+                            timeout: Optional[float] = None, **kwargs) -> Any:
+        if timeout is not None:
+            kwargs['timeout'] = ClientTimeout(total=timeout, sock_connect=SBIS_CONNECT_TIMEOUT)
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.breaker.allow_request():
+            raise SBISUnavailableError()
+        try:
+            return await self._send_with_retries(method, url, raw, **kwargs)
+        finally:
+            # Отмененный пробный запрос не должен навсегда оставить
+            # предохранитель полуоткрытым
+            if probe:
+                self.breaker.release_probe()
+
+    async def _send_with_retries(self, method: str, url: str, raw: bool, **kwargs) -> Any:
+        # Повторяются только ошибки сети и 5xx; 4xx означает, что СБИС
+        # ответил, поэтому запрос не повторяется и сбоем сервиса не считается
+        retries = SBIS_RETRIES
         for attempt in range(retries):
+            client_status = None
             try:
-                async with self.session.request(method, url, **kwargs) as response:
+                async with self._get_session().request(method, url, **kwargs) as response:
                     if response.status == 200:
-                        return await response.json()
+                        data = await response.read() if raw else await response.json(content_type=None)
+                        self.breaker.record_success()
+                        return data
                     elif response.status == 401 and attempt < retries - 1:
-                        self._token_cache.clear()
+                        await self._refresh_auth_header(kwargs)
                         continue
+                    elif response.status < 500:
+                        client_status = response.status
                     else:
                         raise SBISRequestError(f"Status: {response.status}")
             except Exception as e:
-                if attempt == retries - 1:
-                    logger.error(f"Request failed after {
-                                 retries} attempts: {str(e)}")
-                    raise SBISRequestError(str(e))
-                await asyncio.sleep(1)
-
-    @staticmethod
-    async def get_point_id(token: TokenValidation) -> dict:
-        url = 'https://api.sbis.ru/retail/point/list'
+                error = e
+            if client_status is not None:
+                logger.error(f"Request rejected with status {client_status}")
+                self.breaker.record_success()
+                raise SBISRequestError(f"Status: {client_status}")
+
+            last_attempt = attempt == retries - 1 or self.breaker.is_open
+            if last_attempt or isinstance(error, SBISUnavailableError):
+                logger.error(f"Request failed after {attempt + 1} attempts: {str(error)}")
+                self.breaker.record_failure()
+                if isinstance(error, SBISException):
+                    raise error
+                raise SBISRequestError(str(error))
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def get_point_id(self, token: TokenValidation) -> dict:
+        url = f'{self.API_URL}/point/list'
         headers = {"X-SBISAccessToken": token.access_token}
         params = {
             'withPhones': 'true',
             'withPrices': 'true'
         }
-        response = requests.get(url, params=params, headers=headers)
-        return response.json()
+        return await self._make_request('GET', url, params=params, headers=headers)
 
-    @staticmethod
-    async def get_price_lists(token: TokenValidation, point_id: int) -> dict:
+    async def get_price_lists(self, token: TokenValidation, point_id: int) -> dict:
         parameters = {
             'pointId': point_id,
             'actualDate': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        url = 'https://api.sbis.ru/retail/nomenclature/price-list?'
+        url = f'{self.API_URL}/nomenclature/price-list'
         headers = {"X-SBISAccessToken": token.access_token}
-        response = requests.get(url, params=parameters, headers=headers)
-        return response.json()
+        return await self._make_request('GET', url, params=parameters, headers=headers)
 
-    @staticmethod
-    async def get_foods(request: FoodsRequest, token: TokenValidation) -> dict:
-        parameters = request.model_dump()
-        url = 'https://api.sbis.ru/retail/nomenclature/list?'
+    async def get_foods(self, request: FoodsRequest, token: TokenValidation) -> dict:
+        parameters = {
+            key: str(value).lower() if isinstance(value, bool) else value
+            for key, value in request.model_dump().items()
+        }
+        url = f'{self.API_URL}/nomenclature/list'
         headers = {"X-SBISAccessToken": token.access_token}
-        response = requests.get(url, params=parameters, headers=headers)
-        return response.json()
+        return await self._make_request(
+            'GET', url, params=parameters, headers=headers,
+            timeout=SBIS_NOMENCLATURE_TIMEOUT
+        )
 
-    @staticmethod
-    async def get_image(token: TokenValidation, image: str, name: str) -> str:
-        url = "https://api.sbis.ru/retail/img"
+    async def iter_foods(self, request: FoodsRequest, token: TokenValidation,
+                         page_size: int = SBIS_PAGE_SIZE) -> AsyncIterator[Dict]:
+        # Номенклатура читается постранично, так что в памяти одновременно
+        # находится не больше одной страницы ответа СБИС
+        page = 0
+        while True:
+            response = await self.get_foods(
+                request.model_copy(update={'page': page, 'pageSize': str(page_size)}),
+                token
+            )
+            items = response.get('nomenclatures') or []
+            for item in items:
+                yield item
+
+            outcome = response.get('outcome') or {}
+            has_more = outcome.get('hasMore', len(items) >= page_size)
+            if not items or not has_more:
+                break
+            page += 1
+
+    async def get_image(self, token: TokenValidation, image: str, name: str) -> str:
+        url = f"{self.API_URL}/img"
         headers = {
             "Content-Type": "application/json; charset=utf-8",
             "Accept": "image/*",
@@ -121,18 +269,21 @@ class SBISService:
         }
         replaced = image.replace("/img?params=", "")
         params = {"params": replaced}
-        response = requests.get(url, params=params, headers=headers)
+        try:
+            content = await self._make_request('GET', url, raw=True, params=params, headers=headers)
+        except SBISRequestError as e:
+            return f"Error while reading response: {e.detail}"
 
-        if response.status_code == 200:
-            try:
-                image_data = BytesIO(response.content)
-                img = Image.open(image_data)
-                img.save(f"images/{name}.png")
-                return f"Image saved as {name}.png"
-            except Exception as e:
-                return f"Failed to process image: {str(e)}"
-        else:
-            return f"Error while reading response: {response.status_code}, {response.text}"
+        try:
+            await asyncio.to_thread(self._save_image, content, name)
+            return f"Image saved as {name}.png"
+        except Exception as e:
+            return f"Failed to process image: {str(e)}"
+
+    @staticmethod
+    def _save_image(content: bytes, name: str) -> None:
+        img = Image.open(BytesIO(content))
+        img.save(f"images/{name}.png")
 
     @staticmethod
     def decode_base64_param(encoded_param: str) -> Optional[str]:
@@ -145,29 +296,139 @@ class SBISService:
             return None
 
 
+# Позиции прайс-листов по умолчанию, если название или id не заданы в окружении
+MENU_PRICE_LIST_INDEX = 3
+CATEGORY_PRICE_LIST_INDEX = 1
+CATEGORY_TREE_KEY = "catalog_categories"
+# Сколько товаров вне последней синхронизации держать в памяти
+PRODUCTS_CACHE_SIZE = 256
+
+
 class SBISBusinessLogic:
 
     def __init__(self, sbis_service: SBISService, redis_service: RedisService):
         self.sbis = sbis_service
         self.redis = redis_service
+        self.metadata = SBISMetadataCache(sbis_service, redis_service)
+        self.images = ImageMirror(redis_service) if IMAGE_MIRROR_ENABLED else None
         self._categories_cache = {}
         self._products_cache = {}
+        self.index = CatalogIndex()
+        self.categories = CategoryTree()
+        self._index_lock = asyncio.Lock()
+        self._payload: Optional[MenuPayload] = None
+        self._payload_index: Optional[CatalogIndex] = None
+        self._payload_lock = asyncio.Lock()
+        # Синхронизацию выполняет только лидер; остальные воркеры лишь
+        # просят его об этом, не чаще раза в sync_request_interval секунд
+        self.sync_request_interval = CATALOG_SYNC_MIN_INTERVAL
+        self.cold_wait = CATALOG_COLD_WAIT
+        self._sync_requested_at = 0.0
+        # Версия меню, известная воркеру, и момент ее последней проверки:
+        # пока проверка свежее max_staleness, чтение индекса не ходит в Redis
+        self.max_staleness = CATALOG_CACHE_MAX_STALENESS
+        self._known_version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._listener_task: Optional[asyncio.Task] = None
+        self.cache_stats = {"hits": 0, "misses": 0, "version_checks": 0, "invalidations": 0}
+
+    async def sync_products(self, auth_data: AuthorizationData) -> Optional[MenuSyncResult]:
+        categories = []
+        products = self.iter_products(auth_data, categories)
+        if self.images:
+            products = self.images.mirror(products)
+        # Индекс и счетчики категорий заполняются постранично вместе с записью в Redis
+        builder = CatalogIndexBuilder()
+
+        async def collect(stream):
+            async for product in stream:
+                builder.add(product)
+                yield product
+
+        result = await self.redis.set_products(collect(products))
+        if result:
+            tree = CategoryTree.build(
+                categories, builder.category_counts, CATALOG_ROOT_CATEGORIES, CATALOG_EXCLUDED_CATEGORIES
+            )
+            if tree.digest != self.categories.digest and not (result.added or result.changed or result.removed):
+                # Категории не входят в хэши товаров, поэтому их изменение
+                # отдельно поднимает версию меню для остальных воркеров
+                result.version = await self.redis.bump_products_version()
+            tree.version = result.version
+            await self.redis.set_json(CATEGORY_TREE_KEY, tree.to_dict())
+            previous_version = self.index.version
+            self.categories = tree
+            self.index = builder.build(result.version)
+            self._remember_version(result.version)
+            await self._build_payload(self.index)
+            if result.version != previous_version:
+                await self.redis.publish_products_version(result.version)
+            logger.info(
+                f"Products cache synced: version {result.version}, "
+                f"+{result.added} ~{result.changed} -{result.removed}"
+            )
+        return result
+
+    def start(self) -> None:
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(self._listen_versions())
+
+    async def close(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self.images:
+            await self.images.close()
+
+    async def _listen_versions(self) -> None:
+        # Синхронизация публикует новую версию меню, и воркер узнает о ней
+        # сразу, не дожидаясь истечения max_staleness
+        while True:
+            try:
+                async for version in self.redis.listen_products_version():
+                    if version != self._known_version:
+                        self.cache_stats["invalidations"] += 1
+                    self._remember_version(version)
+            except Exception as e:
+                logger.error(f"Menu version listener error: {e}")
+            await asyncio.sleep(1)
 
-    async def update_products_cache(self, auth_data: AuthorizationData) -> None:
-        try:
-            products = await self.get_from_primary(auth_data)
-            await self.redis.set_products(products)
-            logger.info("Products cache updated successfully")
-        except Exception as e:
-            logger.error(f"Failed to update products cache: {e}")
+    def _remember_version(self, version: Optional[int]) -> None:
+        self._known_version = version
+        self._version_checked_at = time.monotonic()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache_stats,
+            "version": self.index.version,
+            "products": len(self.index),
+            "max_staleness": self.max_staleness,
+            "checked_ago": round(time.monotonic() - self._version_checked_at, 3)
+            if self._version_checked_at else None,
+        }
 
     async def get_point_info(self, auth_data: AuthorizationData) -> dict:
         token = await self.sbis.get_token(auth_data)
-        point_id = await self.sbis.get_point_id(token)
-        menu = await self.sbis.get_price_lists(token, point_id['salesPoints'][0]['id'])
-        return point_id
+        points = await self.metadata.get_sales_points(token)
+        point = await self.metadata.get_sales_point(token, SBIS_SALES_POINT)
+        await self.metadata.get_price_lists(token, point['id'])
+        return {"salesPoints": points}
+
+    async def _foods_request(self, auth_data: AuthorizationData,
+                             price_list: Optional[str], fallback_index: int,
+                             **options) -> Tuple[TokenValidation, FoodsRequest]:
+        token = await self.sbis.get_token(auth_data)
+        point = await self.metadata.get_sales_point(token, SBIS_SALES_POINT)
+        menu = await self.metadata.get_price_list(token, point['id'], price_list, fallback_index)
+        return token, FoodsRequest(pointId=point['id'], priceListId=menu['id'], **options)
 
     async def get_all_categories(self, auth_data: AuthorizationData) -> List[Dict]:
+        # Ответ /sbis/categories - исходные записи СБИС со всеми полями;
+        # дерево из синхронизации отдают /categories/tree и /categories/flat
         cache_key = auth_data.app_client_id
         cached_data = self._categories_cache.get(cache_key)
 
@@ -186,62 +447,184 @@ class SBISBusinessLogic:
             raise
 
     async def get_from_primary(self, auth_data: AuthorizationData) -> List[Dict[str, Any]]:
-        token = await self.sbis.get_token(auth_data)
-        point_id = await self.sbis.get_point_id(token)
-        menu = await self.sbis.get_price_lists(token, point_id['salesPoints'][0]['id'])
-        foods = await self.sbis.get_foods(
-            FoodsRequest(
-                pointId=point_id['salesPoints'][0]['id'],
-                priceListId=menu["priceLists"][3]["id"],
-                withBalance=True,
-                withBarcode=False,
-                onlyPublished=False,
-            ),
-            token
+        return [product async for product in self.iter_products(auth_data)]
+
+    async def iter_products(self, auth_data: AuthorizationData,
+                            categories: Optional[List[Dict]] = None) -> AsyncIterator[Dict[str, Any]]:
+        token, request = await self._foods_request(
+            auth_data, SBIS_MENU_PRICE_LIST, MENU_PRICE_LIST_INDEX,
+            withBalance=True,
+            withBarcode=False,
+            onlyPublished=False,
         )
+        # Вложенные папки исключенных категорий, встреченные в текущей выгрузке:
+        # дерево прошлой синхронизации о новых папках еще не знает
+        hidden = set()
+        async for item in self.sbis.iter_foods(request, token):
+            parent = item.get("hierarchicalParent")
+            if self._is_category(item):
+                if parent in hidden or self._is_excluded_category(parent):
+                    hidden.add(item["hierarchicalId"])
+                if categories is not None:
+                    categories.append({
+                        "id": item["hierarchicalId"],
+                        "name": item.get("name"),
+                        "parent": parent,
+                    })
+                continue
+            if parent in hidden:
+                continue
+            product = self._normalize_product(item)
+            if product is not None:
+                yield product
 
-        tasks = []
-
-        async def process_item(item: Dict) -> Optional[Dict]:
-            # nonlocal downloaded_count
-            if ('images' in item and item['images'] and
-                    item.get("hierarchicalParent") != 2382):
+    @staticmethod
+    def _is_category(item: Dict) -> bool:
+        return bool(item.get("isParent")) or item.get("cost") is None
 
-                image_url = item['images'][0]
-                encoded_param = image_url.split('?params=')[-1]
-                photo_url = self.sbis.decode_base64_param(encoded_param)
+    def _is_excluded_category(self, category_id: Optional[int]) -> bool:
+        return category_id in CATALOG_EXCLUDED_CATEGORIES or self.categories.is_excluded(category_id)
 
-                if photo_url:
-                    # downloaded_count += 1
-                    return {
-                        "id": item["hierarchicalId"],
-                        "name": item["name"],
-                        "status": "available",
-                        "image": photo_url,
-                        "price": item["cost"],
-                        "description": item["description_simple"]
-                    }
-            return None
+    def _normalize_product(self, item: Dict) -> Optional[Dict[str, Any]]:
+        if ('images' in item and item['images'] and
+                not self._is_excluded_category(item.get("hierarchicalParent"))):
 
-        for item in foods['nomenclatures']:
-            # if downloaded_count >= max_downloads:
-                # break
-            tasks.append(process_item(item))
+            image_url = item['images'][0]
+            encoded_param = image_url.split('?params=')[-1]
+            photo_url = self.sbis.decode_base64_param(encoded_param)
 
-        results = await asyncio.gather(*tasks)
-        return [r for r in results if r is not None]
+            if photo_url:
+                return {
+                    "id": item["hierarchicalId"],
+                    "name": item["name"],
+                    "status": "available",
+                    "image": photo_url,
+                    "price": item["cost"],
+                    "description": item["description_simple"],
+                    "category": item.get("hierarchicalParent")
+                }
+        return None
 
     async def get_kitchen_products(self, auth_data: AuthorizationData) -> List[Dict[str, Any]]:
-        cached_products = await self.redis.get_products()
-        if cached_products:
-            return cached_products
-        else:
-            return await self.get_from_primary(auth_data)
+        products, _ = await self.get_catalog(auth_data)
+        return products
+
+    async def get_catalog(self, auth_data: AuthorizationData) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Возвращает меню и признак устаревания.
+
+        Если в Redis меню нет, отдается последнее известное воркеру меню,
+        а у лидера запрашивается синхронизация. Воркер без меню ждет ее
+        до cold_wait секунд; сам в СБИС он не ходит.
+        """
+        if await self._refresh_index():
+            return self.index.products(), self.sbis.breaker.is_open
+
+        await self._request_sync()
+        if self.index:
+            return self.index.products(), True
+
+        deadline = time.monotonic() + self.cold_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            if await self._refresh_index():
+                return self.index.products(), self.sbis.breaker.is_open
+        raise SBISUnavailableError()
+
+    def _is_current(self, version: Optional[int]) -> bool:
+        return bool(self.index) and self.index.version == version and self.categories.version == version
+
+    async def get_menu_payload(self, auth_data: AuthorizationData) -> Tuple[MenuPayload, bool]:
+        """
+        Готовый ответ меню для текущей версии и признак устаревания.
+
+        Сериализация и сжатие выполняются один раз на версию меню; запросы
+        между синхронизациями получают уже собранные байты.
+        """
+        _, stale = await self.get_catalog(auth_data)
+        index = self.index
+        if self._payload_index is not index:
+            async with self._payload_lock:
+                if self._payload_index is not index:
+                    await self._build_payload(index)
+        return self._payload, stale
+
+    async def _build_payload(self, index: CatalogIndex) -> None:
+        self._payload = await asyncio.to_thread(MenuPayload, index.products(), index.version)
+        self._payload_index = index
+
+    async def _refresh_index(self) -> bool:
+        # Индекс и дерево категорий перестраиваются из Redis только при смене
+        # версии меню; саму версию читаем не чаще раза в max_staleness секунд
+        if (self._is_current(self._known_version)
+                and time.monotonic() - self._version_checked_at < self.max_staleness):
+            self.cache_stats["hits"] += 1
+            return True
+
+        version = await self.redis.get_products_version()
+        self.cache_stats["version_checks"] += 1
+        self._remember_version(version)
+        if self._is_current(version):
+            self.cache_stats["hits"] += 1
+            return True
+
+        self.cache_stats["misses"] += 1
+        async with self._index_lock:
+            if not (self.index and self.index.version == version):
+                products = await self.redis.get_products()
+                if not products:
+                    return False
+                self.index = CatalogIndex(products, version)
+            if self.categories.version != version:
+                tree = await self.redis.get_json(CATEGORY_TREE_KEY)
+                self.categories = CategoryTree.from_dict(tree) if tree else CategoryTree(version=version)
+            return True
+
+    async def get_category_tree(self) -> List[Dict[str, Any]]:
+        await self._refresh_index()
+        return self.categories.tree()
+
+    async def get_category_list(self) -> List[Dict[str, Any]]:
+        await self._refresh_index()
+        return self.categories.flat()
+
+    async def _request_sync(self) -> None:
+        now = time.monotonic()
+        if now - self._sync_requested_at >= self.sync_request_interval:
+            self._sync_requested_at = now
+            await self.redis.request_products_sync()
+
+    async def get_category_products(self, category_id: int) -> List[Dict[str, Any]]:
+        await self._refresh_index()
+        return self.index.by_category(category_id)
+
+    async def search_products(self, name: str) -> List[Dict[str, Any]]:
+        await self._refresh_index()
+        return self.index.by_name(name)
+
+    async def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        # Товары ищутся в индексе; Redis читается одним HMGET, только если
+        # индекс еще не построен
+        indexed = await self._refresh_index()
+        found = {}
+        missing = []
+        for product_id in product_ids:
+            product = self.index.get(product_id)
+            if product:
+                found[product_id] = product
+            else:
+                missing.append(product_id)
+        if missing and not indexed:
+            found.update(await self.redis.get_products_by_ids(missing))
+        return found
 
     async def get_product_details(self, auth_data: AuthorizationData, product_id: int) -> Dict:
-        cached_product = await self.redis.get_product(product_id)
-        if cached_product:
-            return cached_product
+        # Товар из последней синхронизации отдается из индекса, даже если
+        # Redis или СБИС сейчас недоступны
+        await self._refresh_index()
+        indexed_product = self.index.get(product_id)
+        if indexed_product:
+            return indexed_product
 
         cache_key = f"{auth_data.app_client_id}:{product_id}"
         cached_data = self._products_cache.get(cache_key)
@@ -249,9 +632,17 @@ class SBISBusinessLogic:
         if cached_data and cached_data['expires_at'] > datetime.now():
             return cached_data['data']
 
+        # Пока СБИС недоступен, истекший кэш отдается с пометкой stale
+        if self.sbis.breaker.is_open:
+            if cached_data:
+                return {**cached_data['data'], "stale": True}
+            raise SBISUnavailableError()
+
         try:
             product = await self._fetch_product(auth_data, product_id)
             if product['status'] == "Product found":
+                if len(self._products_cache) >= PRODUCTS_CACHE_SIZE:
+                    self._products_cache.pop(next(iter(self._products_cache)))
                 self._products_cache[cache_key] = {
                     'data': product,
                     'expires_at': datetime.now() + timedelta(minutes=5)
@@ -259,44 +650,31 @@ class SBISBusinessLogic:
             return product
         except Exception as e:
             logger.error(f"Failed to fetch product {product_id}: {str(e)}")
+            if cached_data and (self.sbis.breaker.is_open or isinstance(e, SBISUnavailableError)):
+                return {**cached_data['data'], "stale": True}
             raise
 
     async def _fetch_categories(self, auth_data: AuthorizationData) -> List[Dict]:
-        token = await self.sbis.get_token(auth_data)
-        point_id = await self.sbis.get_point_id(token)
-        menu = await self.sbis.get_price_lists(token, point_id['salesPoints'][0]['id'])
-        foods = await self.sbis.get_foods(
-            FoodsRequest(
-                pointId=point_id['salesPoints'][0]['id'],
-                priceListId=menu["priceLists"][1]["id"]
-            ),
-            token
+        token, request = await self._foods_request(
+            auth_data, SBIS_CATEGORY_PRICE_LIST, CATEGORY_PRICE_LIST_INDEX
         )
         return [
-            item for item in foods["nomenclatures"]
-            if item.get("hierarchicalParent") == 2110
+            item async for item in self.sbis.iter_foods(request, token)
+            if item.get("hierarchicalParent") in CATALOG_ROOT_CATEGORIES
         ]
 
     async def _fetch_product(self, auth_data: AuthorizationData, product_id: int) -> Dict:
-        token = await self.sbis.get_token(auth_data)
-        point_id = await self.sbis.get_point_id(token)
-        menu = await self.sbis.get_price_lists(token, point_id['salesPoints'][0]['id'])
-        foods = await self.sbis.get_foods(
-            FoodsRequest(
-                pointId=point_id['salesPoints'][0]['id'],
-                priceListId=menu["priceLists"][3]["id"],
-                withBalance=True,
-                withBarcode=False,
-                onlyPublished=False,
-            ),
-            token
-        )
-
-        product = next(
-            (item for item in foods['nomenclatures']
-             if item['hierarchicalId'] == product_id),
-            None
+        token, request = await self._foods_request(
+            auth_data, SBIS_MENU_PRICE_LIST, MENU_PRICE_LIST_INDEX,
+            withBalance=True,
+            withBarcode=False,
+            onlyPublished=False,
         )
+        product = None
+        async for item in self.sbis.iter_foods(request, token):
+            if item['hierarchicalId'] == product_id:
+                product = item
+                break
 
         if not product:
             return {"status": "Product not found", "id": product_id}
@@ -313,5 +691,6 @@ class SBISBusinessLogic:
             "image": photo_url,
             "price": product["cost"],
             "description": product["description_simple"],
+            "category": product.get("hierarchicalParent"),
             "status": "Product found"
         }
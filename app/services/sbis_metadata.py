@@ -0,0 +1,116 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from config import SBIS_METADATA_TTL
+from dto.dto import TokenValidation
+from exceptions.sbis import SBISRequestError
+from services.redis_service import RedisService
+
+logger = logging.getLogger(__name__)
+
+
+class SBISMetadataCache:
+    """
+    Кэш точек продаж и прайс-листов СБИС.
+
+    Данные меняются редко, поэтому хранятся в памяти процесса и в Redis
+    с TTL, а сам СБИС опрашивается только после истечения срока или
+    ручной инвалидации. Ключи в Redis содержат номер поколения: invalidate
+    увеличивает его, и все воркеры перестают видеть прежние записи,
+    включая свои копии в памяти, которые помечены поколением.
+    """
+
+    REDIS_PREFIX = "sbis_meta"
+    GENERATION_KEY = f"{REDIS_PREFIX}:generation"
+    POINTS_KEY = "points"
+    PRICE_LISTS_KEY = "price_lists:{point_id}"
+
+    def __init__(self, sbis_service, redis_service: RedisService, ttl: int = SBIS_METADATA_TTL):
+        self.sbis = sbis_service
+        self.redis = redis_service
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def _redis_key(self, key: str, generation: int) -> str:
+        return f"{self.REDIS_PREFIX}:{generation}:{key}"
+
+    async def _get(self, key: str) -> Optional[Any]:
+        # Без Redis поколение неизвестно: работает только кэш в памяти
+        generation = await self.redis.get_counter(self.GENERATION_KEY)
+        cached = self._entries.get(key)
+        if (cached and cached['expires_at'] > datetime.now()
+                and generation in (None, cached['generation'])):
+            return cached['data']
+        if generation is None:
+            return None
+
+        data = await self.redis.get_json(self._redis_key(key, generation))
+        if data is not None:
+            self._remember(key, data, generation)
+        return data
+
+    async def _set(self, key: str, data: Any) -> None:
+        generation = await self.redis.get_counter(self.GENERATION_KEY)
+        self._remember(key, data, generation)
+        if generation is not None:
+            await self.redis.set_json(self._redis_key(key, generation), data, ttl=self.ttl)
+
+    def _remember(self, key: str, data: Any, generation: Optional[int]) -> None:
+        self._entries[key] = {
+            'data': data,
+            'generation': generation,
+            'expires_at': datetime.now() + timedelta(seconds=self.ttl)
+        }
+
+    async def get_sales_points(self, token: TokenValidation) -> List[Dict]:
+        points = await self._get(self.POINTS_KEY)
+        if points is None:
+            response = await self.sbis.get_point_id(token)
+            points = response.get('salesPoints') or []
+            await self._set(self.POINTS_KEY, points)
+        return points
+
+    async def get_price_lists(self, token: TokenValidation, point_id: int) -> List[Dict]:
+        key = self.PRICE_LISTS_KEY.format(point_id=point_id)
+        price_lists = await self._get(key)
+        if price_lists is None:
+            response = await self.sbis.get_price_lists(token, point_id)
+            price_lists = response.get('priceLists') or []
+            await self._set(key, price_lists)
+        return price_lists
+
+    async def get_sales_point(self, token: TokenValidation,
+                              selector: Optional[Union[int, str]] = None) -> Dict:
+        points = await self.get_sales_points(token)
+        return self._resolve(points, selector, 0, "Sales point")
+
+    async def get_price_list(self, token: TokenValidation, point_id: int,
+                             selector: Optional[Union[int, str]] = None,
+                             fallback_index: int = 0) -> Dict:
+        price_lists = await self.get_price_lists(token, point_id)
+        return self._resolve(price_lists, selector, fallback_index, "Price list")
+
+    async def invalidate(self) -> None:
+        # Записи прежнего поколения в Redis истекут сами по TTL
+        self._entries.clear()
+        generation = await self.redis.bump_counter(self.GENERATION_KEY)
+        logger.info(f"SBIS metadata cache invalidated, generation {generation}")
+
+    @staticmethod
+    def _resolve(items: List[Dict], selector: Optional[Union[int, str]],
+                 fallback_index: int, kind: str) -> Dict:
+        # Выбор по id или названию; без селектора берется позиция по индексу,
+        # как раньше в коде были зашиты priceLists[3] и priceLists[1]
+        if selector is None or selector == "":
+            if len(items) > fallback_index:
+                return items[fallback_index]
+            raise SBISRequestError(f"{kind} #{fallback_index} not found")
+
+        selector = str(selector).strip()
+        for item in items:
+            if selector.isdigit() and item.get('id') == int(selector):
+                return item
+            if str(item.get('name', '')).strip().casefold() == selector.casefold():
+                return item
+        raise SBISRequestError(f"{kind} '{selector}' not found")
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from config import SBIS_TOKEN_TTL, SBIS_TOKEN_REFRESH_MARGIN
+from dto.dto import AuthorizationData, TokenValidation
+from services.redis_service import RedisService
+
+logger = logging.getLogger(__name__)
+
+
+class SBISTokenManager:
+    """
+    Токен СБИС, общий для всех воркеров.
+
+    Токен хранится в Redis, за новым в /oauth/service/ ходит только владелец
+    блокировки, остальные процессы ждут его результат. Фоновая задача
+    обновляет токен заранее, до истечения срока, поэтому получение токена
+    не попадает во время ответа на запрос.
+    """
+
+    TOKEN_KEY = "sbis_token:{client_id}"
+    LOCK_KEY = "sbis_token_lock:{client_id}"
+    LOCK_TTL = 15
+    LOCK_WAIT = 5
+    LOCK_POLL_INTERVAL = 0.1
+
+    def __init__(self, sbis_service, redis_service: RedisService,
+                 ttl: int = SBIS_TOKEN_TTL, refresh_margin: int = SBIS_TOKEN_REFRESH_MARGIN):
+        self.sbis = sbis_service
+        self.redis = redis_service
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._owner = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_token(self, data: AuthorizationData) -> TokenValidation:
+        entry = self._valid_entry(data.app_client_id, time.time())
+        if entry:
+            return entry['token']
+
+        async with self._lock:
+            entry = await self._acquire(data, time.time())
+            return entry['token']
+
+    async def invalidate(self, data: AuthorizationData, stale_access_token: Optional[str]) -> None:
+        # Получив 401, сбрасываем токен только если он еще тот самый,
+        # иначе его уже обновил другой запрос или другой воркер
+        async with self._lock:
+            entry = self._tokens.get(data.app_client_id)
+            if entry and entry['token'].access_token != stale_access_token:
+                return
+            self._tokens.pop(data.app_client_id, None)
+
+            key = self.TOKEN_KEY.format(client_id=data.app_client_id)
+            stored = await self.redis.get_json(key)
+            if stored and stored['token']['access_token'] == stale_access_token:
+                await self.redis.delete(key)
+            logger.info("SBIS token invalidated")
+
+    def start(self, data: AuthorizationData) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop(data))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self, data: AuthorizationData) -> None:
+        while True:
+            try:
+                async with self._lock:
+                    entry = await self._acquire(data, time.time() + self.refresh_margin)
+                delay = entry['expires_at'] - self.refresh_margin - time.time()
+            except Exception as e:
+                logger.error(f"Failed to refresh SBIS token: {e}")
+                delay = 5
+            await asyncio.sleep(max(delay, 1))
+
+    def _valid_entry(self, client_id: str, valid_until: float) -> Optional[Dict[str, Any]]:
+        entry = self._tokens.get(client_id)
+        if entry and entry['expires_at'] > valid_until:
+            return entry
+        return None
+
+    def _remember(self, client_id: str, stored: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {
+            'token': TokenValidation(**stored['token']),
+            'expires_at': stored['expires_at']
+        }
+        self._tokens[client_id] = entry
+        return entry
+
+    async def _load(self, key: str, client_id: str, valid_until: float) -> Optional[Dict[str, Any]]:
+        stored = await self.redis.get_json(key)
+        if stored and stored['expires_at'] > valid_until:
+            return self._remember(client_id, stored)
+        return None
+
+    async def _acquire(self, data: AuthorizationData, valid_until: float) -> Dict[str, Any]:
+        client_id = data.app_client_id
+        entry = self._valid_entry(client_id, valid_until)
+        if entry:
+            return entry
+
+        key = self.TOKEN_KEY.format(client_id=client_id)
+        lock_key = self.LOCK_KEY.format(client_id=client_id)
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while time.monotonic() < deadline:
+            entry = await self._load(key, client_id, valid_until)
+            if entry:
+                return entry
+
+            if await self.redis.acquire_lock(lock_key, self._owner, self.LOCK_TTL):
+                try:
+                    entry = await self._load(key, client_id, valid_until)
+                    if entry:
+                        return entry
+                    return await self._fetch(key, data)
+                finally:
+                    await self.redis.release_lock(lock_key, self._owner)
+
+            await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+
+        # Redis недоступен или блокировка зависла: получаем токен сами
+        logger.warning("SBIS token lock wait timed out, fetching token directly")
+        return await self._fetch(key, data)
+
+    async def _fetch(self, key: str, data: AuthorizationData) -> Dict[str, Any]:
+        token = await self.sbis.fetch_token(data)
+        stored = {'token': token.model_dump(), 'expires_at': time.time() + self.ttl}
+        await self.redis.set_json(key, stored, ttl=self.ttl)
+        logger.info("SBIS token refreshed")
+        return self._remember(data.app_client_id, stored)
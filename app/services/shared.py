@@ -0,0 +1,32 @@
+# Общие для процесса экземпляры сервисов: один пул соединений СБИС,
+# один менеджер токена, один индекс меню, один диспетчер outbox,
+# одна очередь сообщений Telegram, один хаб WebSocket и доска заказов на воркер
+from auth.database import async_session_maker
+from config import APP_CLIENT_ID, APP_SECRET, APP_SECRET_KEY
+from dto.dto import AuthorizationData
+from services.order_board import OrderBoard
+from services.outbox import OutboxDispatcher
+from services.redis_service import RedisService
+from services.sales import SalesRollup
+from services.sbis import SBISService, SBISBusinessLogic
+from services.sbis_token import SBISTokenManager
+from services.sync_scheduler import CatalogSyncScheduler
+from services.telegram import TelegramNotifier
+from services.ws_hub import WebsocketHub
+
+auth_data = AuthorizationData(
+    app_client_id=APP_CLIENT_ID,
+    app_secret=APP_SECRET,
+    secret_key=APP_SECRET_KEY
+)
+
+redis_service = RedisService()
+sbis_service = SBISService()
+sbis_service.tokens = SBISTokenManager(sbis_service, redis_service)
+sbis_logic = SBISBusinessLogic(sbis_service, redis_service)
+sync_scheduler = CatalogSyncScheduler(sbis_logic, redis_service, auth_data)
+order_outbox = OutboxDispatcher(async_session_maker, redis_service)
+telegram = TelegramNotifier()
+ws_hub = WebsocketHub()
+sales_rollup = SalesRollup()
+order_board = OrderBoard()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import (
+    CATALOG_SYNC_INTERVAL, CATALOG_SYNC_MIN_INTERVAL, CATALOG_SYNC_MAX_INTERVAL, CATALOG_SYNC_LEASE
+)
+from dto.dto import AuthorizationData
+from services.redis_service import RedisService
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSyncScheduler:
+    """
+    Периодическая синхронизация меню с СБИС.
+
+    Синхронизацию выполняет только воркер, удерживающий блокировку лидера
+    в Redis; аренда продлевается, пока лидер жив. Интервал сокращается,
+    когда меню меняется, и растет, когда изменений нет; после ошибок
+    выполняется экспоненциальная задержка со случайным разбросом.
+
+    Остальные воркеры сами в СБИС не ходят: если им не хватает меню, они
+    публикуют запрос на синхронизацию, и лидер просыпается раньше срока.
+    """
+
+    LEADER_KEY = "catalog_sync_leader"
+    STATUS_KEY = "catalog_sync_status"
+
+    def __init__(self, sbis_logic, redis_service: RedisService, auth_data: AuthorizationData,
+                 interval: float = CATALOG_SYNC_INTERVAL,
+                 min_interval: float = CATALOG_SYNC_MIN_INTERVAL,
+                 max_interval: float = CATALOG_SYNC_MAX_INTERVAL,
+                 lease: float = CATALOG_SYNC_LEASE):
+        self.sbis_logic = sbis_logic
+        self.redis = redis_service
+        self.auth_data = auth_data
+        self.base_interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lease = lease
+        self.interval = interval
+        self.is_leader = False
+        self._failures = 0
+        self._owner = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(self._listen_requests())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._listener_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._listener_task = None
+        if self.is_leader:
+            await self.redis.release_lock(self.LEADER_KEY, self._owner)
+            self.is_leader = False
+
+    async def get_status(self) -> Dict:
+        status = await self.redis.get_hash(self.STATUS_KEY)
+        return {**status, "is_leader": self.is_leader}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self._ensure_leadership():
+                    delay = await self._sync_once()
+                else:
+                    delay = self.base_interval
+            except Exception as e:
+                logger.error(f"Catalog sync scheduler error: {e}")
+                delay = self.base_interval
+            await self._sleep(delay)
+
+    async def _ensure_leadership(self) -> bool:
+        if self.is_leader:
+            self.is_leader = await self.redis.extend_lock(self.LEADER_KEY, self._owner, self.lease)
+            if not self.is_leader:
+                logger.warning("Catalog sync leadership lost")
+        else:
+            self.is_leader = await self.redis.acquire_lock(self.LEADER_KEY, self._owner, self.lease)
+            if self.is_leader:
+                logger.info("Catalog sync leadership acquired")
+        return self.is_leader
+
+    async def _listen_requests(self) -> None:
+        # Запросы синхронизации от воркеров, которым не хватило меню
+        while True:
+            try:
+                async for _ in self.redis.listen_products_sync_requests():
+                    self._wakeup.set()
+            except Exception as e:
+                logger.error(f"Catalog sync request listener error: {e}")
+            await asyncio.sleep(1)
+
+    async def _sleep(self, delay: float) -> None:
+        # Спим частями, продлевая аренду, чтобы лидерство не истекло
+        # во время длинного интервала. Запрос синхронизации прерывает сон,
+        # но не раньше min_interval: поток запросов не должен превращаться
+        # в непрерывную синхронизацию
+        start = time.monotonic()
+        deadline = start + delay
+        earliest = start + min(delay, self.min_interval)
+        self._wakeup.clear()
+        while True:
+            now = time.monotonic()
+            if now >= deadline or (self._wakeup.is_set() and now >= earliest):
+                return
+            timeout = min(deadline - now, self.lease / 3)
+            if self._wakeup.is_set():
+                await asyncio.sleep(min(timeout, earliest - now))
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            if self.is_leader:
+                await self._ensure_leadership()
+
+    async def _keep_lease(self) -> None:
+        while self.is_leader:
+            await asyncio.sleep(self.lease / 3)
+            await self._ensure_leadership()
+
+    async def _sync_once(self) -> float:
+        started_at = datetime.now()
+        start = time.monotonic()
+        status = {"leader": self._owner, "last_run_at": started_at.isoformat()}
+        keeper = asyncio.create_task(self._keep_lease())
+        try:
+            result = await self.sbis_logic.sync_products(self.auth_data)
+            if result is None:
+                raise RuntimeError("menu sync returned no result")
+        except Exception as e:
+            self._failures += 1
+            delay = self._backoff_delay()
+            logger.error(f"Catalog sync failed ({self._failures} in a row): {e}")
+            status.update(result="error", error=str(e), failures=self._failures)
+        else:
+            self._failures = 0
+            changes = result.added + result.changed + result.removed
+            delay = self._adapt_interval(changes)
+            status.update(
+                result="ok", error="", failures=0, version=result.version,
+                added=result.added, changed=result.changed, removed=result.removed,
+            )
+        finally:
+            keeper.cancel()
+
+        status.update(
+            duration=round(time.monotonic() - start, 3),
+            interval=round(delay, 1),
+            next_run_at=datetime.fromtimestamp(time.time() + delay).isoformat(),
+        )
+        await self.redis.set_hash(self.STATUS_KEY, status)
+        return delay
+
+    def _adapt_interval(self, changes: int) -> float:
+        if changes:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        return self.interval
+
+    def _backoff_delay(self) -> float:
+        delay = min(self.max_interval, self.base_interval * 2 ** (self._failures - 1))
+        return random.uniform(delay / 2, delay)
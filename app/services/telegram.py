@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from redis.asyncio import Redis
+
+from config import (
+    TELEGRAM_API_URL, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST,
+    TELEGRAM_CONCURRENCY, TELEGRAM_MAX_RETRIES, TELEGRAM_TIMEOUT
+)
+from services.redis_pool import get_redis
+from utils.rate_limit import RedisTokenBucket, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class TelegramNotifier:
+    """
+    Отправка сообщений в Telegram Bot API с соблюдением лимитов.
+
+    У каждого чата своя очередь и свой обработчик, поэтому медленный чат
+    не задерживает остальные. Частота ограничивается корзинами токенов
+    на бота и на чат, одновременных запросов не больше concurrency.
+    Корзина бота хранится в Redis: лимит Telegram общий для всех воркеров
+    и бота администраторов.
+    Ответ 429 приостанавливает бота на retry_after, ошибки сети и 5xx
+    повторяются с задержкой, остальные ошибки возвращаются сразу.
+    """
+
+    BOT_BUCKET_KEY = "telegram_rate:{bot_id}"
+
+    def __init__(self, api_url: str = TELEGRAM_API_URL,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = TELEGRAM_CHAT_RATE,
+                 chat_burst: float = TELEGRAM_CHAT_BURST,
+                 concurrency: int = TELEGRAM_CONCURRENCY,
+                 max_retries: int = TELEGRAM_MAX_RETRIES,
+                 client: Optional[Redis] = None):
+        self.redis = client or get_redis()
+        self.api_url = api_url.rstrip("/")
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session: Optional[ClientSession] = None
+        self._bot_buckets: Dict[str, RedisTokenBucket] = {}
+        self._chat_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._queues: Dict[Tuple[str, str], Deque] = {}
+        self._runners: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(timeout=ClientTimeout(total=TELEGRAM_TIMEOUT))
+        return self._session
+
+    async def close(self) -> None:
+        for runner in list(self._runners.values()):
+            runner.cancel()
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def send(self, token: str, chat_id, text: str,
+                   reply_markup: Optional[Dict[str, Any]] = None,
+                   max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ставит сообщение в очередь чата и ждет результат отправки.
+        max_retries=0 отключает повторы, когда их делает вызывающий (outbox).
+        """
+        payload = {"chat_id": chat_id, "text": text}
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+
+        key = (token, str(chat_id))
+        future = asyncio.get_running_loop().create_future()
+        retries = self.max_retries if max_retries is None else max_retries
+        self._queues.setdefault(key, deque()).append((payload, retries, future))
+        runner = self._runners.get(key)
+        if runner is None or runner.done():
+            self._runners[key] = asyncio.create_task(self._run_chat(key))
+        return await future
+
+    def notify(self, token: str, chat_id, text: str,
+               reply_markup: Optional[Dict[str, Any]] = None) -> asyncio.Task:
+        """Отправка без ожидания результата; ошибка только логируется."""
+        task = asyncio.create_task(self.send(token, chat_id, text, reply_markup))
+        task.add_done_callback(self._log_failure)
+        return task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"Telegram notification failed: {task.exception()}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "active_chats": len(self._runners),
+        }
+
+    async def _run_chat(self, key: Tuple[str, str]) -> None:
+        token, _ = key
+        queue = self._queues[key]
+        chat_bucket = self._chat_buckets.setdefault(key, TokenBucket(self.chat_rate, self.chat_burst))
+        bot_bucket = self._bot_buckets.get(token)
+        if bot_bucket is None:
+            # В ключе только id бота - публичная часть токена до двоеточия
+            key = self.BOT_BUCKET_KEY.format(bot_id=token.split(":", 1)[0])
+            bot_bucket = self._bot_buckets[token] = RedisTokenBucket(self.redis, key, self.global_rate)
+        try:
+            while queue:
+                payload, retries, future = queue.popleft()
+                if future.done():
+                    continue
+                try:
+                    result = await self._deliver(token, payload, retries, chat_bucket, bot_bucket)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.stats["sent"] += 1
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._runners.pop(key, None)
+            if not queue:
+                self._queues.pop(key, None)
+                if chat_bucket.idle:
+                    self._chat_buckets.pop(key, None)
+
+    async def _deliver(self, token: str, payload: Dict[str, Any], max_retries: int,
+                       chat_bucket: TokenBucket, bot_bucket: RedisTokenBucket) -> Dict[str, Any]:
+        url = f"{self.api_url}/bot{token}/sendMessage"
+        for attempt in range(max_retries + 1):
+            await chat_bucket.acquire()
+            await bot_bucket.acquire()
+            try:
+                async with self._semaphore:
+                    async with self._get_session().post(url, json=payload) as response:
+                        body = await response.json(content_type=None)
+                        status = response.status
+            except (ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = TelegramError(f"Telegram request failed: {e}")
+            else:
+                body = body if isinstance(body, dict) else {}
+                if status == 200 and body.get("ok"):
+                    return body.get("result", {})
+                description = body.get("description", "")
+                error = TelegramError(f"Telegram API error {status}: {description}", status)
+                if status == 429:
+                    retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                    self.stats["rate_limited"] += 1
+                    await bot_bucket.pause(retry_after)
+                    chat_bucket.pause(retry_after)
+                    continue
+                if status < 500:
+                    raise error
+
+            if attempt < max_retries:
+                self.stats["retried"] += 1
+                await asyncio.sleep(min(30, 0.5 * 2 ** attempt))
+        raise error
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+from redis.asyncio import Redis
+
+from config import WS_QUEUE_SIZE, WS_SLOW_POLICY, WS_SEND_TIMEOUT, WS_TOKEN_SECRET
+from services.redis_pool import get_redis, iter_messages
+
+logger = logging.getLogger(__name__)
+
+
+class WebsocketConnection:
+    """
+    Подключенный клиент: подписки и ограниченная очередь исходящих сообщений.
+
+    Сообщения отправляет отдельная задача, поэтому медленный клиент копит
+    очередь только у себя. При переполнении старое сообщение отбрасывается
+    (policy="drop") или клиент отключается (policy="disconnect").
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, policy: str):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.policy = policy
+        self.topics: Set[str] = set()
+        self.queue: Deque[str] = deque()
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def offer(self, message: str) -> bool:
+        """Ставит сообщение в очередь; False — клиента нужно отключить."""
+        if len(self.queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(message)
+        self._ready.set()
+        return True
+
+    async def _write(self, send_timeout: float) -> None:
+        while True:
+            await self._ready.wait()
+            while self.queue:
+                message = self.queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(message), send_timeout)
+            self._ready.clear()
+
+
+class WebsocketHub:
+    """
+    Рассылка событий заказов клиентам WebSocket.
+
+    Событие публикуется в Redis в канал ws:<тема>, и каждый воркер,
+    подписанный на шаблон ws:*, раздает его своим клиентам этой темы.
+    Темы: order:<id> (статус заказа), user:<id> (заказы пользователя)
+    и admins (все заказы для администраторов). На темы заказа и пользователя
+    подписываются по токену - подписи темы ключом token_secret, который
+    выдается только владельцу (см. routers.order).
+    """
+
+    CHANNEL_PREFIX = "ws:"
+    ADMINS = "admins"
+
+    def __init__(self, client: Optional[Redis] = None, queue_size: int = WS_QUEUE_SIZE,
+                 slow_policy: str = WS_SLOW_POLICY, send_timeout: float = WS_SEND_TIMEOUT,
+                 token_secret: Optional[str] = WS_TOKEN_SECRET):
+        self._client = client
+        self.token_secret = token_secret
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.send_timeout = send_timeout
+        self.stats = {"published": 0, "received": 0, "delivered": 0, "dropped": 0, "slow_disconnects": 0}
+        self._connections: Set[WebsocketConnection] = set()
+        self._topics: Dict[str, Set[WebsocketConnection]] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self) -> Redis:
+        # Клиент берется при первом обращении, чтобы хаб можно было создать при импорте
+        if self._client is None:
+            self._client = get_redis()
+        return self._client
+
+    @staticmethod
+    def order_topic(order_id) -> str:
+        return f"order:{order_id}"
+
+    @staticmethod
+    def user_topic(user_id) -> str:
+        return f"user:{user_id}"
+
+    def sign(self, topic: str) -> Optional[str]:
+        """Токен подписки на тему; None, если ключ подписи не задан."""
+        if not self.token_secret:
+            return None
+        return hmac.new(self.token_secret.encode(), topic.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, topic: str, token: Any) -> bool:
+        expected = self.sign(topic)
+        return expected is not None and isinstance(token, str) and hmac.compare_digest(token, expected)
+
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = ()) -> WebsocketConnection:
+        await websocket.accept()
+        connection = WebsocketConnection(websocket, self.queue_size, self.slow_policy)
+        self._connections.add(connection)
+        for topic in topics:
+            self.subscribe(connection, topic)
+        connection._writer = asyncio.create_task(connection._write(self.send_timeout))
+        connection._writer.add_done_callback(lambda task: self._on_writer_done(connection, task))
+        return connection
+
+    async def disconnect(self, connection: WebsocketConnection, code: Optional[int] = None) -> None:
+        if connection not in self._connections:
+            return
+        self._connections.discard(connection)
+        for topic in list(connection.topics):
+            self.unsubscribe(connection, topic)
+        self.stats["dropped"] += connection.dropped
+        if connection._writer and connection._writer is not asyncio.current_task():
+            connection._writer.cancel()
+        if code is not None:
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+
+    def subscribe(self, connection: WebsocketConnection, topic: str) -> None:
+        connection.topics.add(topic)
+        self._topics.setdefault(topic, set()).add(connection)
+
+    def unsubscribe(self, connection: WebsocketConnection, topic: str) -> None:
+        connection.topics.discard(topic)
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._topics[topic]
+
+    async def publish(self, topics: Iterable[str], event: Dict[str, Any]) -> None:
+        # Публикуется и из API, и из бота: событие дойдет до клиентов всех воркеров
+        pipe = self.redis.pipeline(transaction=False)
+        count = 0
+        for topic in topics:
+            message = json.dumps({"topic": topic, "event": event}, ensure_ascii=False, default=str)
+            pipe.publish(f"{self.CHANNEL_PREFIX}{topic}", message)
+            count += 1
+        await pipe.execute()
+        self.stats["published"] += count
+
+    def dispatch(self, topic: str, message: str) -> int:
+        """Раздает готовое сообщение локальным подписчикам темы без ожидания отправки."""
+        delivered = 0
+        for connection in list(self._topics.get(topic, ())):
+            if connection.offer(message):
+                delivered += 1
+            else:
+                self.stats["slow_disconnects"] += 1
+                # 1013 Try Again Later: клиент не успевает читать сообщения
+                asyncio.create_task(self.disconnect(connection, code=1013))
+        self.stats["delivered"] += delivered
+        return delivered
+
+    def start(self) -> None:
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        for connection in list(self._connections):
+            await self.disconnect(connection, code=1001)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "dropped": self.stats["dropped"] + sum(c.dropped for c in self._connections),
+            "connections": len(self._connections),
+            "topics": len(self._topics),
+            "queued": sum(len(c.queue) for c in self._connections),
+        }
+
+    async def _listen(self) -> None:
+        prefix_length = len(self.CHANNEL_PREFIX)
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                async for message in iter_messages(pubsub):
+                    self.stats["received"] += 1
+                    self.dispatch(message["channel"][prefix_length:], message["data"])
+            except Exception as e:
+                logger.error(f"WebSocket hub listener error: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    def _on_writer_done(self, connection: WebsocketConnection, task: asyncio.Task) -> None:
+        # Отправка упала (клиент ушел или не читает дольше send_timeout)
+        error = None if task.cancelled() else task.exception()
+        if error is not None and connection in self._connections:
+            if isinstance(error, asyncio.TimeoutError):
+                self.stats["slow_disconnects"] += 1
+            asyncio.create_task(self.disconnect(connection, code=1011))
@@ -0,0 +1,67 @@
+"""
+Сравнение кодеков значений Redis на типичных данных.
+
+Запуск из каталога app:
+
+    python -m utils.codec_benchmark [--products 500] [--repeat 200]
+"""
+import argparse
+import timeit
+from typing import Any, Dict, List
+
+from utils.serialization import CODECS, dumps, loads
+
+
+def sample_products(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": 3000 + i,
+            "name": f"Кимчи рамен с говядиной №{i}",
+            "status": "available",
+            "image": f"/static/products/{i:040x}-card.webp",
+            "thumbnail": f"/static/products/{i:040x}-thumb.webp",
+            "price": 390 + i % 7 * 10,
+            "description": "Острый суп с лапшой, говядиной, кимчи и яйцом. Подается с кунжутом.",
+            "category": 2111 + i % 12,
+        }
+        for i in range(count)
+    ]
+
+
+def sample_order() -> Dict[str, Any]:
+    return {
+        "number": 1042,
+        "client": 123456789,
+        "payment": "Картой при получении",
+        "isDelivery": True,
+        "address": "г. Москва, ул. Пушкина, д. 10, кв. 5",
+        "cutlery": 2,
+        "total": 2340,
+        "items": [
+            {"foodName": f"Блюдо {i}", "count": 1 + i % 3, "price": 390} for i in range(6)
+        ],
+    }
+
+
+def run(products: int, repeat: int) -> None:
+    samples = {
+        "product": sample_products(1)[0],
+        "order": sample_order(),
+        f"menu[{products}]": sample_products(products),
+    }
+    print(f"{'value':<12}{'codec':<10}{'bytes':>10}{'encode, us':>14}{'decode, us':>14}")
+    for label, value in samples.items():
+        for codec in CODECS.values():
+            data = dumps(value, codec)
+            assert loads(data) == loads(dumps(value, CODECS["json"]))
+            encode = timeit.timeit(lambda: dumps(value, codec), number=repeat) / repeat
+            decode = timeit.timeit(lambda: loads(data), number=repeat) / repeat
+            print(f"{label:<12}{codec.name:<10}{len(data):>10}{encode * 1e6:>14.1f}{decode * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.products, args.repeat)
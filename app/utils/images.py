@@ -0,0 +1,39 @@
+import os
+from io import BytesIO
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+# Название варианта -> максимальная сторона в пикселях
+VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+}
+WEBP_QUALITY = 80
+
+
+def render_variants(data: bytes, directory: str, digest: str) -> Dict[str, str]:
+    """
+    Сохраняет WebP-варианты изображения по адресу, зависящему от содержимого.
+
+    Выполняется в пуле процессов, поэтому работает только с байтами и путями.
+    Возвращает пути вариантов относительно directory.
+    """
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    paths = {}
+    for name, size in VARIANTS.items():
+        relative_path = f"{digest[:2]}/{digest}_{name}.webp"
+        path = os.path.join(directory, relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            variant.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+        paths[name] = relative_path
+    return paths
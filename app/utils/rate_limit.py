@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Корзина в Redis: время берется из TIME, чтобы все процессы считали по одним часам.
+# Возвращает 0, если токен выдан, иначе сколько миллисекунд ждать
+REDIS_BUCKET_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'paused_until')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local paused_until = tonumber(state[3]) or 0
+if now < paused_until then
+    return paused_until - now
+end
+tokens = math.min(capacity, tokens + (now - updated) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now, 'paused_until', paused_until)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 60000)
+return wait
+"""
+
+REDIS_BUCKET_PAUSE_SCRIPT = """
+local time = redis.call('TIME')
+local until_ms = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000) + tonumber(ARGV[1])
+local paused_until = tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0
+if until_ms > paused_until then
+    redis.call('HSET', KEYS[1], 'paused_until', until_ms)
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[1]) + 60000)
+end
+return 1
+"""
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты: rate токенов в секунду, не больше capacity подряд.
+
+    Ожидающие получают токены в порядке очереди. pause() запрещает выдачу
+    на заданное время, например по retry_after из ответа 429.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        # Корзина полна и никто не ждет: ее можно удалить без потери состояния
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RedisTokenBucket:
+    """
+    Корзина токенов в Redis, общая для всех воркеров и процессов.
+
+    Лимит внешнего API действует на бота целиком, поэтому корзина в памяти
+    процесса пропускала бы workers * rate запросов. Если Redis недоступен,
+    используется локальная корзина, чтобы отправка не останавливалась.
+    """
+
+    def __init__(self, client, key: str, rate: float, capacity: float = 1):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._acquire = client.register_script(REDIS_BUCKET_ACQUIRE_SCRIPT)
+        self._pause = client.register_script(REDIS_BUCKET_PAUSE_SCRIPT)
+        self._fallback = TokenBucket(rate, capacity)
+        self._lock = asyncio.Lock()
+
+    @property
+    def idle(self) -> bool:
+        return not self._lock.locked()
+
+    async def pause(self, seconds: float) -> None:
+        self._fallback.pause(seconds)
+        try:
+            await self._pause(keys=[self.key], args=[int(seconds * 1000)])
+        except Exception as e:
+            logger.error(f"Error pausing rate limit {self.key}: {e}")
+
+    async def acquire(self) -> None:
+        # Локальная блокировка сохраняет порядок очереди внутри процесса
+        async with self._lock:
+            while True:
+                try:
+                    wait = await self._acquire(keys=[self.key], args=[self.rate, self.capacity])
+                except Exception as e:
+                    logger.error(f"Error acquiring rate limit {self.key}, using local bucket: {e}")
+                    await self._fallback.acquire()
+                    return
+                if not wait:
+                    return
+                await asyncio.sleep(wait / 1000)
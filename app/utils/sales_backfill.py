@@ -0,0 +1,41 @@
+"""
+Пересчет сводок продаж из истории заказов.
+
+Запуск из каталога app:
+
+    python -m utils.sales_backfill [--since 2025-01-01]
+
+Без --since сводки пересчитываются целиком. Заказы, созданные во время
+пересчета, дождутся его окончания и попадут в сводки обычным путем.
+Заказы без времени создания (старше колонки createdAt) не учитываются.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+from typing import Optional
+
+
+async def run(since: Optional[date]) -> None:
+    from auth.database import async_session_maker, engine
+    from services.sales import SalesRollup
+
+    start = time.monotonic()
+    async with async_session_maker() as session:
+        counts = await SalesRollup().backfill(session, since)
+        await session.commit()
+    await engine.dispose()
+
+    print(f"hours:        {counts['hours']}")
+    print(f"days:         {counts['days']}")
+    print(f"product-days: {counts['products']}")
+    print(f"skipped:      {counts['skipped']} orders without createdAt")
+    print(f"elapsed, s:   {time.monotonic() - start:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--since", type=date.fromisoformat, default=None,
+                        help="первый пересчитываемый день (местное время)")
+    args = parser.parse_args()
+    asyncio.run(run(args.since))
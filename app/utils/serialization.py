@@ -0,0 +1,96 @@
+import json
+import logging
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Значения в Redis начинаются с байта версии формата и байта кодека.
+# Значения без префикса записаны до появления кодеков обычным json.dumps,
+# поэтому во время перехода читаются любые форматы вперемешку
+FORMAT_VERSION = b"\x01"
+
+
+class Codec:
+    name = "json"
+    tag = b"j"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+    tag = b"o"
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    tag = b"m"
+
+    def encode(self, value: Any) -> bytes:
+        # Ключи сортируются, чтобы одинаковые значения давали одинаковые байты
+        return msgpack.packb(self._sorted(value), use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    def _sorted(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: self._sorted(value[key]) for key in sorted(value, key=str)}
+        if isinstance(value, (list, tuple)):
+            return [self._sorted(item) for item in value]
+        return value
+
+
+CODECS: Dict[str, Codec] = {"json": Codec()}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+_BY_TAG = {codec.tag: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        logger.warning(f"Codec {name} is not available, falling back to json")
+        codec = CODECS["json"]
+    return codec
+
+
+def dumps(value: Any, codec: Codec) -> bytes:
+    return FORMAT_VERSION + codec.tag + codec.encode(value)
+
+
+def loads(data: Optional[Union[str, bytes]]) -> Any:
+    if data is None:
+        return None
+    if isinstance(data, str):
+        # Клиент Redis декодирует ответы с surrogateescape, так что двоичные
+        # данные восстанавливаются без потерь
+        data = data.encode("utf-8", "surrogateescape")
+    if data[:1] != FORMAT_VERSION:
+        return json.loads(data)
+    codec = _BY_TAG.get(data[1:2])
+    if codec is None:
+        raise ValueError(f"Unknown codec tag {data[1:2]!r}")
+    return codec.decode(data[2:])
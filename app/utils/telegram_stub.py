@@ -0,0 +1,111 @@
+"""
+Локальная заглушка Telegram Bot API и проверка рассылки под нагрузкой.
+
+Заглушка принимает sendMessage, соблюдает лимиты Telegram (на бота и на чат)
+и отвечает 429 с retry_after при их превышении. Запуск из каталога app:
+
+    python -m utils.telegram_stub [--orders 200] [--admins 1]
+
+отправляет через TelegramNotifier подтверждения клиентам и уведомления
+администраторам для пачки заказов и печатает время, число 429 и ошибок.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from aiohttp import web
+
+
+class TelegramStub:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: int = 1,
+                 retry_after: int = 1):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        self.messages: List[Dict] = []
+        self.rejected = 0
+        self._bot_sent: Dict[str, deque] = defaultdict(deque)
+        self._chat_sent: Dict[tuple, deque] = defaultdict(deque)
+        self._runner = None
+
+    def _over_limit(self, sent: deque, rate: float, burst: float, now: float) -> bool:
+        # Скользящее окно в одну секунду с небольшим допуском на неточность таймеров
+        window = max(1.0, burst / rate)
+        while sent and now - sent[0] > window:
+            sent.popleft()
+        return len(sent) >= max(burst, rate * window) * 1.05
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        token = request.match_info["token"]
+        payload = await request.json()
+        chat_id = str(payload.get("chat_id"))
+        now = time.monotonic()
+        bot_sent = self._bot_sent[token]
+        chat_sent = self._chat_sent[(token, chat_id)]
+        if (self._over_limit(bot_sent, self.global_rate, self.global_rate, now)
+                or self._over_limit(chat_sent, self.chat_rate, self.chat_burst, now)):
+            self.rejected += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        bot_sent.append(now)
+        chat_sent.append(now)
+        self.messages.append(payload)
+        return web.json_response({
+            "ok": True,
+            "result": {"message_id": len(self.messages), "chat": {"id": payload.get("chat_id")},
+                       "text": payload.get("text")},
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def run(orders: int, admins: int) -> None:
+    from services.telegram import TelegramNotifier
+
+    stub = TelegramStub()
+    url = await stub.start()
+    notifier = TelegramNotifier(api_url=url)
+    sends = []
+    start = time.monotonic()
+    for number in range(orders):
+        sends.append(notifier.send("client", 100000 + number, f"Ваш заказ №{number} принят"))
+        for admin in range(admins):
+            sends.append(notifier.send("admin", admin, f"Новый заказ №{number}"))
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    elapsed = time.monotonic() - start
+    failures = sum(isinstance(result, Exception) for result in results)
+    await notifier.close()
+    await stub.stop()
+
+    print(f"messages:     {len(sends)}")
+    print(f"delivered:    {len(stub.messages)}")
+    print(f"failures:     {failures}")
+    print(f"429 answers:  {stub.rejected}")
+    print(f"elapsed, s:   {elapsed:.1f}")
+    print(f"rate, msg/s:  {len(stub.messages) / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--admins", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.orders, args.admins))
@@ -0,0 +1,33 @@
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Проверяет initData Telegram Mini App и возвращает пользователя Telegram.
+
+    Подпись считается по правилам Telegram: ключ - HMAC-SHA256 токена бота
+    с ключом "WebAppData", подписываются отсортированные поля key=value
+    через перевод строки. None - подпись не сошлась, данные старше max_age
+    секунд или в них нет пользователя.
+    """
+    fields = dict(parse_qsl(init_data or "", keep_blank_values=True))
+    received = fields.pop("hash", "")
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(received, expected):
+        return None
+
+    try:
+        auth_date = int(fields.get("auth_date", 0))
+        user = json.loads(fields.get("user", ""))
+    except ValueError:
+        return None
+    if max_age and time.time() - auth_date > max_age:
+        return None
+    return user if isinstance(user, dict) and "id" in user else None
@@ -0,0 +1,167 @@
+"""
+Нагрузочная проверка WebSocket-хаба заказов.
+
+Открывает тысячи соединений к /order/ws, подписывает их на заказы,
+пользователей и тему admins, публикует события через Redis и печатает
+число доставленных сообщений, задержку и поведение медленных клиентов.
+Токены тем подписываются ключом WS_TOKEN_SECRET, он должен совпадать
+с ключом сервера. Без --url поднимает в процессе один воркер с роутером
+заказов (нужен доступный Redis из настроек). Запуск из каталога app:
+
+    python -m utils.ws_loadtest [--clients 2000] [--events 50] [--slow 20] [--payload 256]
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+from typing import Dict, List
+
+import websockets
+
+ADMIN_EVERY = 100  # каждый сотый клиент подписан на admins
+
+
+async def serve(port: int):
+    import uvicorn
+    from fastapi import FastAPI
+    from routers.order import orderRouter
+    from services.shared import ws_hub
+
+    app = FastAPI()
+    app.include_router(orderRouter, prefix="/order")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           ws="websockets", backlog=4096))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    ws_hub.start()
+    return server, task
+
+
+class Client:
+    def __init__(self, number: int, orders: int, slow: bool):
+        self.order_id = number % orders
+        self.user_id = number % (orders * 2)
+        self.admin = number % ADMIN_EVERY == 0
+        self.slow = slow
+        self.latencies: List[float] = []
+        self.closed_code = None
+
+    async def run(self, url: str, admin_token: str, ready: asyncio.Event, done: asyncio.Event):
+        from services.shared import ws_hub
+
+        query = (f"?order_id={self.order_id}&order_token={ws_hub.sign(ws_hub.order_topic(self.order_id))}"
+                 f"&user_id={self.user_id}&user_token={ws_hub.sign(ws_hub.user_topic(self.user_id))}")
+        if self.admin:
+            query += f"&admin_token={admin_token}"
+        try:
+            async with websockets.connect(url + query, max_queue=None if not self.slow else 1,
+                                          open_timeout=60) as socket:
+                ready.set()
+                if self.slow:
+                    # Медленный клиент не читает сообщения, пока идет рассылка
+                    await done.wait()
+                    self.closed_code = socket.close_code
+                    return
+                while True:
+                    message = json.loads(await socket.recv())
+                    self.latencies.append(time.time() - message["event"]["sent_at"])
+        except websockets.ConnectionClosed as e:
+            self.closed_code = e.rcvd.code if e.rcvd else None
+        except asyncio.CancelledError:
+            pass
+
+
+async def run(url: str, clients: int, orders: int, events: int, slow: int, payload: int,
+              admin_token: str) -> None:
+    from config import WS_ADMIN_TOKEN
+    from services.shared import ws_hub
+
+    admin_token = admin_token or WS_ADMIN_TOKEN or ""
+    if not ws_hub.token_secret:
+        print("WS_TOKEN_SECRET is not set: order and user topics are unavailable")
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = None
+    if not url:
+        server, server_task = await serve(8765)
+        url = "ws://127.0.0.1:8765/order/ws"
+
+    done = asyncio.Event()
+    population = [Client(number, orders, number < slow) for number in range(clients)]
+    readiness = [asyncio.Event() for _ in population]
+    tasks = []
+    start = time.monotonic()
+    for client, ready in zip(population, readiness):
+        tasks.append(asyncio.create_task(client.run(url, admin_token, ready, done)))
+        # Подключения открываются пачками, чтобы не переполнить очередь accept
+        if len(tasks) % 200 == 0:
+            await asyncio.sleep(0.05)
+    await asyncio.gather(*(ready.wait() for ready in readiness))
+    connect_time = time.monotonic() - start
+
+    # Каждое событие уходит в тему заказа, пользователя и администраторам
+    start = time.monotonic()
+    for number in range(events):
+        order_id = number % orders
+        await ws_hub.publish(
+            [ws_hub.order_topic(order_id), ws_hub.user_topic(order_id), ws_hub.ADMINS],
+            {"type": "order_status", "order_id": order_id, "state": "accepted",
+             "padding": "x" * payload, "sent_at": time.time()},
+        )
+    expected = sum(
+        sum((number % orders == client.order_id) + (number % orders == client.user_id)
+            for number in range(events))
+        + (events if client.admin and admin_token else 0)
+        for client in population if not client.slow
+    )
+    deadline = time.monotonic() + 30
+    received = 0
+    while time.monotonic() < deadline:
+        received = sum(len(client.latencies) for client in population)
+        if received >= expected:
+            break
+        await asyncio.sleep(0.1)
+    publish_time = time.monotonic() - start
+    stats: Dict = ws_hub.get_stats() if server else {}
+
+    done.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if server:
+        await ws_hub.stop()
+        server.should_exit = True
+        await server_task
+
+    latencies = sorted(latency for client in population for latency in client.latencies)
+    slow_closed = sum(1 for client in population if client.slow and client.closed_code)
+    print(f"clients:        {clients} (slow {slow})")
+    print(f"connect, s:     {connect_time:.1f}")
+    print(f"events:         {events}")
+    print(f"delivered:      {received} of {expected}")
+    print(f"fan-out, s:     {publish_time:.2f}")
+    if latencies:
+        print(f"latency p50/p99, ms: {latencies[len(latencies) // 2] * 1000:.1f}"
+              f" / {latencies[int(len(latencies) * 0.99)] * 1000:.1f}")
+    print(f"slow closed:    {slow_closed}")
+    if stats:
+        print(f"hub stats:      {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="", help="ws://host:port/order/ws; без него сервер поднимается в процессе")
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--slow", type=int, default=20, help="клиенты, которые не читают сообщения")
+    parser.add_argument("--payload", type=int, default=256, help="размер события в байтах")
+    parser.add_argument("--admin-token", default="", help="по умолчанию WS_ADMIN_TOKEN")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.clients, args.orders, args.events, args.slow, args.payload,
+                    args.admin_token))
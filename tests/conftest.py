@@ -0,0 +1,21 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def run():
+    """
+    Выполняет async-сценарий с чистым fakeredis (Lua-скрипты через lupa).
+    Клиент создается внутри цикла событий сценария.
+    """
+    def runner(scenario):
+        async def main():
+            client = fakeredis.FakeAsyncRedis(decode_responses=True)
+            try:
+                return await scenario(client)
+            finally:
+                await client.aclose()
+        return asyncio.run(main())
+    return runner
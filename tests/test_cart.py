@@ -0,0 +1,55 @@
+import json
+
+from dto.dto import CartRedis
+from services.redis_service import RedisService
+
+
+def items(cart):
+    return {item["product_id"]: item["quantity"] for item in cart["items"]}
+
+
+def test_add_update_delete(run):
+    async def scenario(client):
+        redis = RedisService(client, cart_ttl=600)
+        await redis.add_to_cart(CartRedis(user_id=1, product_id=10, quantity=2))
+        added = await redis.add_to_cart(CartRedis(user_id=1, product_id=10, quantity=1))
+        await redis.add_to_cart(CartRedis(user_id=1, product_id=20, quantity=1))
+        # Количество меняется только у товара, который уже в корзине
+        updated = await redis.update_from_cart(CartRedis(user_id=1, product_id=30, quantity=5))
+        removed = await redis.add_to_cart(CartRedis(user_id=1, product_id=20, quantity=-1))
+        deleted = await redis.delete_from_cart(10, "1")
+        return added, updated, removed, deleted, await client.ttl("cart:1")
+
+    added, updated, removed, deleted, ttl = run(scenario)
+    assert items(added) == {10: 3}
+    assert items(updated) == {10: 3, 20: 1}
+    assert items(removed) == {10: 3}
+    assert items(deleted) == {}
+    assert ttl == -2
+
+
+def test_ttl_is_refreshed(run):
+    async def scenario(client):
+        redis = RedisService(client, cart_ttl=600)
+        await redis.add_to_cart(CartRedis(user_id=1, product_id=10, quantity=1))
+        await client.expire("cart:1", 5)
+        await redis.get_cart(1)
+        return await client.ttl("cart:1")
+
+    assert run(scenario) > 5
+
+
+def test_legacy_json_cart_is_migrated(run):
+    legacy = {"items": [{"product_id": 10, "quantity": 2}, {"product_id": 20, "quantity": 0}]}
+
+    async def scenario(client):
+        redis = RedisService(client, cart_ttl=600)
+        await client.set("cart:1", json.dumps(legacy))
+        await client.set("cart:2", json.dumps(legacy))
+        migrated = await redis.migrate_carts()
+        return migrated, await client.type("cart:2"), await redis.get_cart(1)
+
+    migrated, kind, cart = run(scenario)
+    assert migrated == 2
+    assert kind == "hash"
+    assert items(cart) == {10: 2}
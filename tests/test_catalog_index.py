@@ -0,0 +1,36 @@
+from services.catalog_index import CatalogIndex, CatalogIndexBuilder
+from services.category_tree import CategoryTree
+
+CATEGORIES = [
+    {"id": 1, "name": "Меню", "parent": None},
+    {"id": 2, "name": "Супы", "parent": 1},
+    {"id": 3, "name": "Закуски", "parent": 1},
+]
+PRODUCTS = [
+    {"id": 30, "name": "Кимчи", "category": 3},
+    {"id": 10, "name": "Рамен", "category": 2},
+    {"id": 20, "name": "Токпокки", "category": 3},
+]
+
+
+def test_builder_matches_full_index():
+    builder = CatalogIndexBuilder()
+    for product in PRODUCTS:
+        builder.add(product)
+    index = builder.build(version=7)
+
+    expected = CatalogIndex(PRODUCTS, 7)
+    assert index.version == 7
+    assert index.products() == expected.products()
+    assert [p["id"] for p in index.by_category(3)] == [20, 30]
+    assert index.get(10)["name"] == "Рамен"
+
+
+def test_tree_counts_from_builder():
+    builder = CatalogIndexBuilder()
+    for product in PRODUCTS:
+        builder.add(product)
+    tree = CategoryTree.build(CATEGORIES, builder.category_counts, roots=[1])
+
+    counts = {row["hierarchicalId"]: (row["product_count"], row["total_count"]) for row in tree.flat()}
+    assert counts == {1: (0, 3), 3: (2, 2), 2: (1, 1)}
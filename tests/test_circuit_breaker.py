@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+import services.sbis as sbis
+from exceptions.sbis import SBISRequestError, SBISUnavailableError
+from services.sbis import SBISService
+from utils.circuit_breaker import CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+
+    async def json(self, content_type=None):
+        return self.data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Отдает заранее заданные ответы; None - запрос зависает."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if status is None:
+            return Hang()
+        return FakeResponse(status, {"ok": True})
+
+
+class Hang:
+    async def __aenter__(self):
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_service(session, monkeypatch, retries=3):
+    monkeypatch.setattr(sbis, "SBIS_RETRIES", retries)
+    service = SBISService()
+    service._get_session = lambda: session
+    return service
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker._opened_at -= breaker.cooldown
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_probe_releases_breaker(monkeypatch):
+    async def scenario():
+        service = make_service(FakeSession(None, 200), monkeypatch)
+        open_breaker(service.breaker)
+        probe = asyncio.create_task(service._send_request("POST", "url"))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert service.breaker.state == CircuitBreaker.HALF_OPEN
+        return await service._send_request("POST", "url")
+
+    assert asyncio.run(scenario()) == {"ok": True}
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    session = FakeSession(404, 200)
+    service = make_service(session, monkeypatch)
+    with pytest.raises(SBISRequestError):
+        asyncio.run(service._send_request("POST", "url"))
+    assert session.calls == 1
+    assert service.breaker.get_stats()["failures"] == 0
+
+
+def test_server_errors_are_retried_and_counted(monkeypatch):
+    session = FakeSession(500, 503)
+    service = make_service(session, monkeypatch, retries=2)
+    with pytest.raises(SBISRequestError):
+        asyncio.run(service._send_request("POST", "url"))
+    assert session.calls == 2
+    assert service.breaker.get_stats()["failures"] == 1
+
+
+def test_open_breaker_rejects_without_request(monkeypatch):
+    session = FakeSession()
+    service = make_service(session, monkeypatch)
+    open_breaker(service.breaker)
+    service.breaker._opened_at += service.breaker.cooldown
+    with pytest.raises(SBISUnavailableError):
+        asyncio.run(service._send_request("POST", "url"))
+    assert session.calls == 0
@@ -0,0 +1,31 @@
+from services.redis_service import RedisService
+
+
+def test_cache_is_stored_for_current_version(run):
+    async def scenario(client):
+        redis = RedisService(client)
+        version = await redis.get_grouped_menu_version()
+        stored = await redis.set_grouped_menu('{"a":1}', version, 60)
+        return version, stored, await redis.get_grouped_menu(), await client.ttl(RedisService.GROUPED_MENU_KEY)
+
+    version, stored, body, ttl = run(scenario)
+    assert version == "0"
+    assert stored and body == '{"a":1}'
+    assert 0 < ttl <= 60
+
+
+def test_stale_build_does_not_overwrite_invalidation(run):
+    async def scenario(client):
+        redis = RedisService(client)
+        # Построение началось, и в это время меню изменилось
+        version = await redis.get_grouped_menu_version()
+        await redis.invalidate_grouped_menu()
+        stored = await redis.set_grouped_menu('{"old":1}', version, 60)
+        fresh_version = await redis.get_grouped_menu_version()
+        fresh = await redis.set_grouped_menu('{"new":1}', fresh_version, 60)
+        return stored, fresh_version, fresh, await redis.get_grouped_menu()
+
+    stored, fresh_version, fresh, body = run(scenario)
+    assert not stored
+    assert fresh_version == "1"
+    assert fresh and body == '{"new":1}'
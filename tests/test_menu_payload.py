@@ -0,0 +1,55 @@
+import gzip
+
+import pytest
+
+from services.catalog_index import CatalogIndex
+from services.menu_payload import MenuPayload
+from utils.serialization import CODECS, dumps, loads
+
+# Товары в том виде, в каком их собирает лидер: ключи в порядке вставки
+LEADER_PRODUCTS = [
+    {"id": 3002, "name": "Кимчи", "status": "available", "image": "https://x/2.webp",
+     "price": 250, "description": "острое", "category": 2111, "thumbnail": "https://x/2t.webp"},
+    {"id": 3001, "name": "Рамен", "status": "available", "image": "https://x/1.webp",
+     "price": 390.5, "description": None, "category": 2112},
+]
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_etag_is_the_same_on_leader_and_follower(codec):
+    leader = MenuPayload(CatalogIndex(LEADER_PRODUCTS).products(), version=1)
+    # Последователь читает товары из Redis: ключи после декодирования отсортированы
+    stored = {str(p["id"]): dumps(p, CODECS[codec]) for p in reversed(LEADER_PRODUCTS)}
+    follower = MenuPayload(CatalogIndex(loads(v) for v in stored.values()).products(), version=1)
+
+    assert follower.etag == leader.etag
+    assert follower.select("gzip") == leader.select("gzip")
+
+
+def test_etag_changes_with_content():
+    changed = [dict(LEADER_PRODUCTS[0], price=260), LEADER_PRODUCTS[1]]
+    assert MenuPayload(changed).etag != MenuPayload(LEADER_PRODUCTS).etag
+
+
+def test_select_prefers_brotli_then_gzip():
+    payload = MenuPayload(LEADER_PRODUCTS)
+    identity, encoding = payload.select(None)
+    assert encoding == "identity"
+
+    body, encoding = payload.select("gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body) == identity
+
+    _, encoding = payload.select("gzip;q=0, identity")
+    assert encoding == "identity"
+
+    _, encoding = payload.select("br, gzip")
+    assert encoding in ("br", "gzip")
+
+
+def test_matches_if_none_match():
+    payload = MenuPayload(LEADER_PRODUCTS)
+    assert payload.matches(payload.etag)
+    assert payload.matches(f'"other", W/{payload.etag}')
+    assert payload.matches("*")
+    assert not payload.matches('"other"')
+    assert not payload.matches(None)
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from exceptions.order import OrderStateError
+from services.order_board import OrderBoard
+from utils.serialization import get_codec
+
+ORDER = {"id": 7, "number": "A-7", "items": [{"id": 1, "count": 2}], "total": 900}
+
+
+def make_board(client):
+    return OrderBoard(client, codec=get_codec("json"))
+
+
+def test_add_is_idempotent(run):
+    async def scenario(client):
+        board = make_board(client)
+        first = await board.add(ORDER)
+        await board.transition(7, OrderBoard.ACCEPTED)
+        second = await board.add(ORDER)
+        return first, second, await board.get_counts()
+
+    first, second, counts = run(scenario)
+    assert (first, second) == (True, False)
+    assert counts[OrderBoard.ACCEPTED] == 1 and counts[OrderBoard.NEW] == 0
+
+
+def test_transitions_move_between_state_sets(run):
+    async def scenario(client):
+        board = make_board(client)
+        created = time.time() - 60
+        await board.add(ORDER)
+        await client.zadd("order_board:new", {"7": created})
+        previous = [
+            await board.transition(7, OrderBoard.ACCEPTED),
+            await board.transition(7, OrderBoard.COOKING),
+            await board.transition(7, OrderBoard.COOKING),
+        ]
+        return previous, created, await board.get_board(), await client.zscore("order_board:cooking", "7")
+
+    previous, created, state, score = run(scenario)
+    assert previous == [OrderBoard.NEW, OrderBoard.ACCEPTED, OrderBoard.COOKING]
+    assert [order["number"] for order in state[OrderBoard.COOKING]] == ["A-7"]
+    assert state[OrderBoard.COOKING][0]["state"] == OrderBoard.COOKING
+    # Время создания переносится вместе с заказом
+    assert score == pytest.approx(created)
+
+
+def test_forbidden_transition_and_force(run):
+    async def scenario(client):
+        board = make_board(client)
+        await board.add(ORDER)
+        with pytest.raises(OrderStateError):
+            await board.transition(7, OrderBoard.DELIVERING)
+        forced = await board.transition(7, OrderBoard.DELIVERING, force=True)
+        return forced, await board.get_counts()
+
+    forced, counts = run(scenario)
+    assert forced == OrderBoard.NEW
+    assert counts[OrderBoard.DELIVERING] == 1 and counts[OrderBoard.NEW] == 0
+
+
+def test_terminal_state_removes_order(run):
+    async def scenario(client):
+        board = make_board(client)
+        await board.add(ORDER)
+        previous = await board.transition(7, OrderBoard.DECLINED)
+        missing = await board.transition(7, OrderBoard.ACCEPTED)
+        return previous, missing, await board.get_counts(), await client.hlen(OrderBoard.ORDERS_KEY)
+
+    previous, missing, counts, snapshots = run(scenario)
+    assert previous == OrderBoard.NEW
+    assert missing is None
+    assert not any(counts.values()) and snapshots == 0
+
+
+def test_board_drops_expired_orders(run):
+    async def scenario(client):
+        board = make_board(client)
+        board.max_age = 60
+        await board.add(ORDER, created_at=None)
+        await board.add({**ORDER, "id": 8})
+        await client.zadd("order_board:new", {"8": time.time() - 120})
+        return await board.get_board(), await client.hexists(OrderBoard.STATES_KEY, "8")
+
+    state, exists = run(scenario)
+    assert [order["id"] for order in state[OrderBoard.NEW]] == [7]
+    assert not exists
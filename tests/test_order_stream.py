@@ -0,0 +1,42 @@
+import pytest
+from redis.exceptions import ResponseError
+
+from services.order_stream import OrderStream
+
+
+def test_group_is_recreated_after_flush(run):
+    async def scenario(client):
+        stream = OrderStream(client, consumer="bot-1")
+        await stream.ensure_group()
+        await client.flushall()
+        # Redis отвечает NOGROUP; у fakeredis текст ошибки другой
+        with pytest.raises(ResponseError):
+            await stream.read(block=0.01)
+
+        await stream.ensure_group()
+        entry_id = await stream.publish({"number": 1})
+        return entry_id, await stream.read(block=0.01)
+
+    entry_id, entries = run(scenario)
+    assert entries == [(entry_id, {"number": 1})]
+
+
+def test_delivery_remembers_chats_until_ack(run):
+    async def scenario(client):
+        stream = OrderStream(client, consumer="bot-1")
+        await stream.ensure_group()
+        entry_id = await stream.publish({"number": 1})
+        await stream.read(block=0.01)
+
+        first = await stream.start_delivery(entry_id)
+        await stream.mark_delivered(entry_id, ["100"])
+        second = await stream.start_delivery(entry_id)
+        await stream.ack(entry_id)
+        pending = await client.xpending(OrderStream.STREAM_KEY, stream.group)
+        return first, second, pending["pending"], await stream.start_delivery(entry_id)
+
+    first, second, pending, after_ack = run(scenario)
+    assert first == (set(), 1)
+    assert second == ({"100"}, 2)
+    assert pending == 0
+    assert after_ack == (set(), 1)
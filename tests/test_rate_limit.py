@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+from utils.rate_limit import RedisTokenBucket
+
+
+def test_bucket_is_shared_between_workers(run):
+    async def scenario(client):
+        workers = [RedisTokenBucket(client, "telegram_rate:1", rate=20) for _ in range(2)]
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for bucket in workers for _ in range(5)))
+        return time.monotonic() - start
+
+    # 10 токенов при 20 в секунду и емкости 1: первый сразу, остальные 9 за ~0.45 с
+    assert run(scenario) >= 0.4
+
+
+def test_pause_applies_to_every_worker(run):
+    async def scenario(client):
+        first, second = (RedisTokenBucket(client, "telegram_rate:1", rate=100) for _ in range(2))
+        await first.pause(0.3)
+        start = time.monotonic()
+        await second.acquire()
+        return time.monotonic() - start
+
+    assert run(scenario) >= 0.25
@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from services.sales import SalesRollup, order_lines
+
+
+def test_order_lines_take_key_quantity_and_amount():
+    lines = order_lines([
+        {"id": 3001, "foodName": "Рамен", "count": 2, "price": 390.5},
+        {"foodName": "Кимчи", "count": "1", "price": "250"},
+        {"count": 3, "price": 10},  # без id и названия не учитывается
+        {"id": 3002, "foodName": "Токпокки", "count": None, "price": "abc"},
+    ])
+    assert lines == [
+        ("3001", "Рамен", 2, Decimal("781.0")),
+        ("Кимчи", "Кимчи", 1, Decimal("250")),
+        ("3002", "Токпокки", 0, Decimal("0")),
+    ]
+    assert order_lines(None) == []
+
+
+def test_local_hour_uses_sales_timezone():
+    rollup = SalesRollup("Asia/Vladivostok")
+    moment = datetime(2025, 1, 31, 14, 45, 12, tzinfo=timezone.utc)
+    # UTC+10: 14:45 UTC - 00:45 следующего дня по местному времени
+    assert rollup.local_hour(moment) == datetime(2025, 2, 1, 0, 0)
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from utils.serialization import CODECS, FORMAT_VERSION, dumps, get_codec, loads
+
+VALUE = {"name": "Кимчи", "price": 350.5, "tags": ["острое"], "nested": {"b": 1, "a": None}}
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_round_trip(name):
+    codec = CODECS[name]
+    data = dumps(VALUE, codec)
+    assert data[:2] == FORMAT_VERSION + codec.tag
+    assert loads(data) == VALUE
+    # Клиент Redis с decode_responses отдает строку, в том числе для msgpack
+    assert loads(data.decode("utf-8", "surrogateescape")) == VALUE
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_encoding_is_stable_for_key_order(name):
+    codec = CODECS[name]
+    reordered = {key: VALUE[key] for key in reversed(list(VALUE))}
+    assert dumps(reordered, codec) == dumps(VALUE, codec)
+
+
+def test_legacy_json_without_prefix():
+    assert loads(json.dumps(VALUE)) == VALUE
+    assert loads(None) is None
+
+
+def test_unknown_codec_falls_back_to_json():
+    assert get_codec("missing") is CODECS["json"]
+    with pytest.raises(ValueError):
+        loads(FORMAT_VERSION + b"?{}")
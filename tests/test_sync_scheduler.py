@@ -0,0 +1,55 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from exceptions.sbis import SBISUnavailableError
+from services.redis_service import RedisService
+from services.sbis import SBISBusinessLogic
+from services.sync_scheduler import CatalogSyncScheduler
+
+
+class NoSync:
+    """Бизнес-логика, которой запрещено ходить в СБИС."""
+
+    async def sync_products(self, auth_data):
+        raise AssertionError("follower must not sync")
+
+
+def test_follower_requests_sync_instead_of_syncing(run):
+    async def scenario(client):
+        redis = RedisService(client)
+        logic = SBISBusinessLogic(SimpleNamespace(breaker=SimpleNamespace(is_open=False)), redis)
+        logic.cold_wait = 0.6
+
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(RedisService.PRODUCTS_SYNC_CHANNEL)
+        with pytest.raises(SBISUnavailableError):
+            await logic.get_catalog(None)
+        messages = [await pubsub.get_message(timeout=0.2) for _ in range(3)]
+        await pubsub.aclose()
+        return [m for m in messages if m]
+
+    (message,) = run(scenario)
+    assert message["channel"] == RedisService.PRODUCTS_SYNC_CHANNEL
+
+
+def test_sync_request_wakes_scheduler(run):
+    async def scenario(client):
+        redis = RedisService(client)
+        scheduler = CatalogSyncScheduler(NoSync(), redis, None, min_interval=0.2, lease=30)
+        listener = asyncio.create_task(scheduler._listen_requests())
+        await asyncio.sleep(0.1)
+
+        start = time.monotonic()
+        sleeper = asyncio.create_task(scheduler._sleep(10))
+        await asyncio.sleep(0.05)
+        await redis.request_products_sync()
+        await asyncio.wait_for(sleeper, 2)
+        elapsed = time.monotonic() - start
+        listener.cancel()
+        return elapsed
+
+    # Просыпается по запросу, но не раньше min_interval
+    assert 0.2 <= run(scenario) < 2